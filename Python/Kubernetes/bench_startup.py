@@ -0,0 +1,126 @@
+#!/usr/bin/python
+"""
+Startup-time benchmark for k8s_util.py
+
+Runs 'k8s_util.py --help' in fresh interpreters with '-X importtime' and reports how long the script takes to
+import and start, compared to a bare interpreter. Exits with a non-zero status if the kubernetes client or
+psycopg2 were imported (they should only be imported by the commands that use them) or if the startup
+overhead goes over the budget.
+
+Usage:
+    python bench_startup.py [--runs N] [--budget-ms MS] [--top N]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+"""
+----------------------------------
+     USER-DEFINED VARIABLES
+----------------------------------
+"""
+
+# Modules that must not be imported just to start k8s_util.py
+HEAVY_MODULES = ['kubernetes', 'psycopg2', 'urllib3', 'yaml', 'orjson']
+
+# How many milliseconds 'k8s_util.py --help' may take on top of a bare interpreter
+STARTUP_BUDGET_MS = 150
+
+# How many times to start each interpreter, the fastest run is reported
+BENCH_RUNS = 5
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'k8s_util.py')
+
+
+def run_interpreter(args):
+    """
+    Starts a fresh interpreter with -X importtime
+    :param args: arguments following 'python -X importtime'
+    :return: a tuple of (wall time in ms, the importtime lines written to stderr)
+    """
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime'] + args,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = proc.communicate()
+    elapsed = (time.time() - start) * 1000
+    if proc.returncode != 0:
+        sys.stderr.write(err.decode('utf-8', 'replace'))
+        raise RuntimeError("{} exited with status {}".format(' '.join(args), proc.returncode))
+    return elapsed, err.decode('utf-8', 'replace').splitlines()
+
+
+def parse_importtime(lines):
+    """
+    Parses '-X importtime' output
+    :param lines: the lines written to stderr
+    :return: a dictionary of module name -> (self us, cumulative us)
+    """
+    modules = {}
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # the header line
+            continue
+        modules[parts[2].strip()] = (self_us, cumulative_us)
+    return modules
+
+
+def bench(args, runs):
+    """
+    Starts the interpreter several times
+    :return: a tuple of (fastest wall time in ms, the importtime modules of that run)
+    """
+    best = None
+    for _ in range(runs):
+        elapsed, lines = run_interpreter(args)
+        if best is None or elapsed < best[0]:
+            best = (elapsed, parse_importtime(lines))
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the startup time of k8s_util.py")
+    parser.add_argument('--runs', type=int, default=BENCH_RUNS, help="interpreter starts per measurement")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="allowed startup overhead over a bare interpreter, in milliseconds")
+    parser.add_argument('--top', type=int, default=10, help="how many of the slowest imports to list")
+    args = parser.parse_args()
+
+    bare_ms, bare_modules = bench(['-c', 'pass'], args.runs)
+    script_ms, script_modules = bench([SCRIPT, '--help'], args.runs)
+    overhead_ms = script_ms - bare_ms
+
+    added = dict((name, times) for name, times in script_modules.items() if name not in bare_modules)
+    print("bare interpreter:      {:8.1f} ms".format(bare_ms))
+    print("k8s_util.py --help:    {:8.1f} ms".format(script_ms))
+    print("startup overhead:      {:8.1f} ms (budget {:.0f} ms)".format(overhead_ms, args.budget_ms))
+    print("modules imported:      {:8d}".format(len(added)))
+    print()
+    print("Slowest imports (self time):")
+    for name, (self_us, cumulative_us) in sorted(added.items(), key=lambda m: m[1][0], reverse=True)[:args.top]:
+        print("  {:>8.1f} ms  {:>8.1f} ms cumulative  {}".format(self_us / 1000.0, cumulative_us / 1000.0, name))
+
+    failures = []
+    heavy = sorted(name for name in added if name.split('.')[0] in HEAVY_MODULES)
+    if heavy:
+        failures.append("heavy modules imported at startup: {}".format(', '.join(heavy)))
+    if overhead_ms > args.budget_ms:
+        failures.append("startup overhead {:.1f} ms is over the {:.0f} ms budget".format(overhead_ms, args.budget_ms))
+
+    if failures:
+        print()
+        for failure in failures:
+            print("FAIL: {}".format(failure))
+        sys.exit(1)
+    print()
+    print("OK")
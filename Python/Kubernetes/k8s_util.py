@@ -2,20 +2,99 @@
 from __future__ import print_function
 from argparse import RawTextHelpFormatter
 
-import re
-from inspect import getmembers, isfunction
-
 import argparse
+import codecs
+import csv
+import functools
+import gzip
+import json
+import math
+import sys
+import threading
 import time
 import os
+import struct
+import subprocess
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from importlib import import_module
+from io import StringIO
+
+
+class _LazyModule(object):
+    """
+    Stands in for a module that is only imported the first time one of its attributes is used.
+    The kubernetes client and psycopg2 take far longer to import than the rest of this script,
+    so deferring them keeps --help and the commands that don't need them fast.
+    """
+
+    def __init__(self, name, *submodules):
+        """
+        :param name: the module to import
+        :param submodules: submodules that must also be imported, e.g. 'psycopg2.pool'
+        """
+        self._name = name
+        self._submodules = submodules
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = import_module(self._name)
+            for submodule in self._submodules:
+                import_module(submodule)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
 
-import psycopg2
-from kubernetes import client, config
-from kubernetes.client.rest import ApiException
+    def __dir__(self):
+        return dir(self._load())
+
+
+psycopg2 = _LazyModule('psycopg2', 'psycopg2.pool')
+sql = _LazyModule('psycopg2.sql')
+client = _LazyModule('kubernetes.client')
+config = _LazyModule('kubernetes.config')
+watch = _LazyModule('kubernetes.watch')
+dynamic = _LazyModule('kubernetes.dynamic')
+
+# Set to the orjson module, or False when it isn't installed, the first time _json_loads() runs
+_orjson = None
 
 PV_TYPE_PVC = "PVC"
 PV_TYPE_PV = "PV"
 
+PG_RESET_TRUNCATE = "truncate"
+PG_RESET_DELETE = "delete"
+PG_SNAPSHOT_MAGIC = b"K8S_UTIL_PG_SNAPSHOT 1\n"
+PG_SNAPSHOT_FRAME_SIZE = 256 * 1024
+
+OUTPUT_TABLE = "table"
+OUTPUT_JSONL = "jsonl"
+OUTPUT_CSV = "csv"
+OUTPUT_FORMATS = [OUTPUT_TABLE, OUTPUT_JSONL, OUTPUT_CSV]
+
+# The fields printed by --listpods and --nsobjects when --fields isn't given
+DEFAULT_POD_FIELDS = ['status.pod_ip', 'metadata.namespace', 'metadata.name']
+DEFAULT_NS_OBJECT_FIELDS = ['resource', 'metadata.namespace', 'metadata.name']
+# The top-level fields --nsobjects can print from a metadata-only list, any other field lists the full objects
+RECORD_METADATA_FIELDS = {'metadata', 'resource', 'cluster'}
+
+# Asks for aggregated discovery (every group and its resources in one response), falling back to the older
+# per-group documents on API servers that don't support it
+DISCOVERY_ACCEPT = ('application/json;g=apidiscovery.k8s.io;v=v2;as=APIGroupDiscoveryList,'
+                    'application/json;g=apidiscovery.k8s.io;v=v2beta1;as=APIGroupDiscoveryList,'
+                    'application/json')
+# Asks for only the metadata of listed objects, falling back to full objects
+METADATA_LIST_ACCEPT = 'application/json;as=PartialObjectMetadataList;v=v1;g=meta.k8s.io,application/json'
+
+DELETE_RESULT_DELETED = "deleted"
+DELETE_RESULT_ALREADY_GONE = "already gone"
+DELETE_RESULT_FAILED = "failed"
+
 """
 --------------------------
   USER-DEFINED VARIABLES 
@@ -44,6 +123,68 @@ HELM_CHARTS = {
     'auxiliary': ['auxiliary-providers']
 }
 
+# The maximum number of objects to request per page when listing objects across the whole cluster
+LIST_PAGE_SIZE = 500
+
+# How long (in seconds) listed services, pods, PVCs and PVs are reused for name lookups before listing them again
+CACHE_TTL_SECONDS = 60
+
+# How many bytes of a pod's log to read at a time when streaming logs
+LOG_CHUNK_SIZE = 64 * 1024
+
+# How many lines from the end of a pod's log get_pod_information() reads when no tail or since limit is given
+POD_INFO_LOG_TAIL_LINES = 10000
+
+# How many Postgres databases to reset at once
+# This value will be used when invoking the --resetpg command
+PG_RESET_WORKERS = 4
+
+# Databases that are never reset by --resetpg (i.e. the server's default database and databases shared with
+# other releases)
+PG_SKIP_DATABASES = ['postgres']
+
+# The gzip compression level (1-9) used by --pgsnapshot, low levels are much faster for a small size cost
+PG_SNAPSHOT_COMPRESSLEVEL = 1
+
+# How many clusters to run a command against at once when using --contexts or --all-contexts
+CLUSTER_WORKERS = 8
+
+# Where the registry of list_namespaced_* functions (one file per kubernetes client version) and the API
+# server's discovery documents (one file per cluster) are cached
+REGISTRY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'k8s_util')
+
+# How long the API server's discovery documents (the resources it serves, including CRDs) are cached for,
+# in memory and in REGISTRY_CACHE_DIR
+DISCOVERY_TTL_SECONDS = 600
+
+# Resources to leave out when gathering all objects in a namespace, as resource.group
+# events.k8s.io serves the same events as the core API
+INVENTORY_SKIP_RESOURCES = ['events.events.k8s.io']
+
+# How many list calls to make at once when gathering all objects in a namespace
+# This value will be used when invoking the --nsobjects command, and can be overridden with --workers
+LIST_WORKERS = 8
+
+# How many times to time a small API request when --plan estimates how long --cleanup or --nuke will take
+PLAN_LATENCY_SAMPLES = 5
+
+# How many PVC/PV delete calls to make at once
+# This value will be used when invoking the --cleanup and --nuke commands, and can be overridden with --parallelism
+DELETE_PARALLELISM = 8
+
+# The command --nuke runs to uninstall a Helm release, '{release}' is replaced with the chart name and
+# '{namespace}' with the namespace the release is installed in (Helm 3 keeps releases per namespace)
+# Use ['helm', 'delete', '{release}', '--purge'] for Helm 2
+HELM_UNINSTALL_COMMAND = ['helm', 'uninstall', '{release}', '--namespace', '{namespace}']
+
+# How long (in seconds) --nuke waits for the Helm uninstall, and for the chart's namespaces to finish terminating
+HELM_TIMEOUT_SECONDS = 300
+NAMESPACE_DELETION_TIMEOUT_SECONDS = 300
+
+# How long to wait for deleted PVs/PVCs to disappear before reporting them as not deleted
+# This value will be used when invoking the --cleanup and --nuke commands
+DELETION_TIMEOUT_SECONDS = 30
+
 """ 
 --------------------------
     UTILITY FUNCTIONS 
@@ -51,6 +192,22 @@ HELM_CHARTS = {
 """
 
 
+def _json_loads(data):
+    """
+    Parses JSON, using orjson when it's installed since it's several times faster than the json module
+    """
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
 def log_title(msg):
     """
     Utility function for pretty-printing a message to the user
@@ -94,27 +251,813 @@ def get_env_var_or_default(default, *env_var):
         return default
 
 
-def get_all_k8s_list_namespaced_functions():
+# Built by get_all_k8s_list_namespaced_functions() the first time it's called
+_list_function_registry = None
+_list_function_registry_lock = threading.Lock()
+
+
+def get_all_k8s_list_namespaced_functions(refresh=False, verbose=False):
+    """
+    Gets the registry of every namespaced resource kind the Kubernetes Python Client can list, mapping each
+    kind (e.g. 'config_map') to its API class and list_namespaced_* function. Scanning the client is slow,
+    so the registry is built once, then kept in memory and on disk (keyed by the client version)
+    :param refresh: rescan the client instead of using the cached registry
+    :param verbose: print each kind's list function
+    :return: an OrderedDict of {kind: (API class, unbound list function)}, sorted by kind
+    """
+    global _list_function_registry
+    with _list_function_registry_lock:
+        if _list_function_registry is None or refresh:
+            registry = None if refresh else _resolve_list_functions(_load_list_function_names())
+            if registry is None:
+                names = _scan_list_functions()
+                _save_list_function_names(names)
+                registry = _resolve_list_functions(names)
+            _list_function_registry = registry
+
+    if verbose:
+        for kind, (api_class, list_function) in _list_function_registry.items():
+            print("{} -- {}.{}".format(kind, api_class.__name__, list_function.__name__))
+    return _list_function_registry
+
+
+def _scan_list_functions():
+    """
+    Walks the Kubernetes Python Client for list_namespaced_* functions that only need a namespace. When a kind
+    is served by more than one API class (e.g. AutoscalingV1Api and AutoscalingV2Api) the most stable, newest
+    version wins
+    :return: an OrderedDict of {kind: (API class name, list function name)}
+    """
+    import re
+    from inspect import isclass, isfunction, signature, Parameter
+
+    stability = {'alpha': 0, 'beta': 1, None: 2}
+    candidates = {}
+    for api_name in dir(client):
+        match = re.match(r'^[A-Z][A-Za-z]*?V(\d+)(?:(alpha|beta)(\d+))?Api$', api_name)
+        api_class = getattr(client, api_name)
+        if not match or not isclass(api_class):
+            continue
+        rank = (stability[match.group(2)], int(match.group(1)), int(match.group(3) or 0))
+
+        for function_name in dir(api_class):
+            if not function_name.startswith('list_namespaced_') or function_name.endswith('_with_http_info'):
+                continue
+            function = getattr(api_class, function_name)
+            if not isfunction(function):
+                continue
+            # skip functions that need more than a namespace, like CustomObjectsApi.list_namespaced_custom_object
+            required = [name for name, param in signature(function).parameters.items()
+                        if name != 'self' and param.default is Parameter.empty
+                        and param.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)]
+            if required != ['namespace']:
+                continue
+
+            kind = function_name[len('list_namespaced_'):]
+            # dir() is sorted, so on a tie (e.g. CoreV1Api and EventsV1Api events) the first class is kept
+            if kind not in candidates or rank > candidates[kind][0]:
+                candidates[kind] = (rank, api_name, function_name)
+
+    return OrderedDict((kind, (api_name, function_name))
+                       for kind, (_, api_name, function_name) in sorted(candidates.items()))
+
+
+def _resolve_list_functions(names):
+    """
+    Looks up the API classes and list functions named in a registry
+    :param names: {kind: (API class name, list function name)}
+    :return: an OrderedDict of {kind: (API class, unbound list function)}, or None if names is None or
+             something in it no longer exists in the client
+    """
+    if names is None:
+        return None
+    registry = OrderedDict()
+    for kind, (api_name, function_name) in names.items():
+        api_class = getattr(client, api_name, None)
+        list_function = getattr(api_class, function_name, None)
+        if list_function is None:
+            return None
+        registry[kind] = (api_class, list_function)
+    return registry
+
+
+def _list_function_registry_path():
+    """
+    :return: the path the list function registry is cached at for the installed client version
+    """
+    import kubernetes
+    return os.path.join(REGISTRY_CACHE_DIR, 'list_functions-{}.json'.format(kubernetes.__version__))
+
+
+def _load_list_function_names():
+    """
+    Reads the list function registry cached on disk
+    :return: an OrderedDict of {kind: (API class name, list function name)}, or None if there isn't one
+    """
+    names = _read_cache_file(_list_function_registry_path())
+    if not isinstance(names, dict):
+        return None
+    return OrderedDict((kind, tuple(names[kind])) for kind in sorted(names))
+
+
+def _save_list_function_names(names):
+    """
+    Caches the list function registry on disk
+    :param names: {kind: (API class name, list function name)}
+    """
+    _write_cache_file(_list_function_registry_path(), names)
+
+
+def _read_cache_file(path):
+    """
+    Reads a JSON file from REGISTRY_CACHE_DIR
+    :return: the decoded JSON, or None if the file is missing or unreadable
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_cache_file(path, data):
+    """
+    Atomically writes a JSON file to REGISTRY_CACHE_DIR, if the directory is writable
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        if not os.path.isdir(REGISTRY_CACHE_DIR):
+            os.makedirs(REGISTRY_CACHE_DIR)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+""" 
+--------------------------
+   K8S CLIENT CONTEXT
+--------------------------    
+"""
+
+
+class K8sClientContext(object):
+    """
+    Loads the kubeconfig once and shares a single pooled ApiClient between all of the typed API classes
+    (CoreV1Api, AppsV1Api, StorageV1Api, etc.) so repeated calls don't re-parse the kubeconfig or open new
+    connection pools
+    """
+
+    def __init__(self, api_client=None, context=None, config_file=None, pool_maxsize=None, name=None):
+        """
+        :param api_client: an existing ApiClient to use instead of loading the kubeconfig (useful for tests)
+        :param context: the kubeconfig context to use, defaults to the current context
+        :param config_file: the kubeconfig file to use, defaults to ~/.kube/config or $KUBECONFIG
+        :param pool_maxsize: the maximum number of pooled connections the ApiClient may keep open
+        :param name: a label for the cluster used to prefix output when running against several clusters,
+                     defaults to the context name
+        """
+        self.name = name or context
+        self.context = context
+        self.config_file = config_file
+        self.pool_maxsize = pool_maxsize
+        self._api_client = api_client
+        self._apis = {}
+        self._cache = None
+        self._discovery = None
+        self._dynamic = None
+        # resolved by get_pg_connection_settings(), the Postgres port is this cluster's service port
+        self.pg_connection_settings = None
+        self._lock = threading.Lock()
+
+    @property
+    def api_client(self):
+        """
+        The shared ApiClient, the kubeconfig is loaded the first time this is accessed
+        """
+        if self._api_client is None:
+            with self._lock:
+                if self._api_client is None:
+                    configuration = client.Configuration()
+                    config.load_kube_config(config_file=self.config_file, context=self.context,
+                                            client_configuration=configuration)
+                    if self.pool_maxsize:
+                        configuration.connection_pool_maxsize = self.pool_maxsize
+                    self._api_client = client.ApiClient(configuration)
+        return self._api_client
+
+    def api(self, api_class):
+        """
+        Gets the (cached) instance of a Kubernetes API class bound to the shared ApiClient
+        :param api_class: the API class to instantiate (i.e. client.CoreV1Api)
+        :return: an instance of api_class
+        """
+        api = self._apis.get(api_class)
+        if api is None:
+            api = api_class(self.api_client)
+            self._apis[api_class] = api
+        return api
+
+    @property
+    def cache(self):
+        """
+        The ObjectCache used to resolve object names for this context, created on first use
+        """
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = ObjectCache(self)
+        return self._cache
+
+    @property
+    def discovery(self):
+        """
+        The ApiDiscovery listing the resources this context's API server serves, created on first use
+        """
+        if self._discovery is None:
+            with self._lock:
+                if self._discovery is None:
+                    self._discovery = ApiDiscovery(self)
+        return self._discovery
+
+    @property
+    def dynamic(self):
+        """
+        A DynamicClient bound to the shared ApiClient, for requests to any resource path. Its own discovery is
+        skipped since ApiDiscovery already knows the resources
+        """
+        if self._dynamic is None:
+            api_client = self.api_client
+            with self._lock:
+                if self._dynamic is None:
+                    self._dynamic = dynamic.DynamicClient(api_client, discoverer=_skip_dynamic_discovery)
+        return self._dynamic
+
+    def core_v1(self):
+        return self.api(client.CoreV1Api)
+
+    def apps_v1(self):
+        return self.api(client.AppsV1Api)
+
+    def storage_v1(self):
+        return self.api(client.StorageV1Api)
+
+    def rbac_v1(self):
+        return self.api(client.RbacAuthorizationV1Api)
+
+    def batch_v1(self):
+        return self.api(client.BatchV1Api)
+
+    def close(self):
+        """
+        Closes the shared ApiClient and its connection pool
+        """
+        if self._api_client is not None:
+            self._api_client.close()
+            self._api_client = None
+            self._apis = {}
+            self._cache = None
+            self._discovery = None
+            self._dynamic = None
+
+
+def _skip_dynamic_discovery(dynamic_client, cache_file):
+    """
+    Stands in for the DynamicClient's discoverer, which would read every group's discovery document on creation
+    """
+    return None
+
+
+class ApiResource(namedtuple('ApiResource', ['group', 'version', 'name', 'kind', 'namespaced', 'verbs'])):
+    """
+    A resource served by the API server, as read from discovery (group is '' for the core API)
+    """
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """
+        The resource's kubectl-style name, i.e. 'pods' or 'deployments.apps'
+        """
+        return '{}.{}'.format(self.name, self.group) if self.group else self.name
+
+    def path(self, namespace):
+        """
+        :return: the API path of this resource in a namespace
+        """
+        if self.group:
+            return '/apis/{}/{}/namespaces/{}/{}'.format(self.group, self.version, namespace, self.name)
+        return '/api/{}/namespaces/{}/{}'.format(self.version, namespace, self.name)
+
+
+class ApiDiscovery(object):
+    """
+    The resources an API server serves, built-in and CRDs alike, read from the /api and /apis discovery
+    documents. Discovery is read once and cached in memory and on disk (per API server) for the TTL.
+    Only the preferred version of each API group is kept
+    """
+
+    def __init__(self, ctx, ttl=None):
+        """
+        :param ctx: the K8sClientContext used to read discovery
+        :param ttl: seconds before discovery is read again, defaults to DISCOVERY_TTL_SECONDS
+        """
+        self._ctx = ctx
+        self.ttl = DISCOVERY_TTL_SECONDS if ttl is None else ttl
+        self._resources = None
+        self._fetched = 0
+        self._lock = threading.Lock()
+
+    def resources(self, refresh=False):
+        """
+        Gets every resource the API server serves
+        :param refresh: read discovery from the API server even if it's cached
+        :return: a list of ApiResources
+        """
+        with self._lock:
+            if refresh or self._resources is None or time.time() - self._fetched > self.ttl:
+                cached = None if refresh else self._load()
+                if cached is None:
+                    cached = (time.time(), self._discover())
+                    self._save(*cached)
+                self._fetched, self._resources = cached
+            return self._resources
+
+    def namespaced_listable(self, refresh=False):
+        """
+        Gets the namespaced resources that can be listed, leaving out INVENTORY_SKIP_RESOURCES
+        :param refresh: read discovery from the API server even if it's cached
+        :return: a list of ApiResources
+        """
+        return [r for r in self.resources(refresh) if r.namespaced and 'list' in r.verbs
+                and r.key not in INVENTORY_SKIP_RESOURCES]
+
+    def _get(self, path, accept='application/json'):
+        response = self._ctx.dynamic.request('get', path, header_params={'Accept': accept}, serialize=False)
+        return _json_loads(response.data)
+
+    def _discover(self):
+        """
+        Reads /api and /apis, as aggregated discovery when the API server supports it
+        """
+        resources = []
+        group_versions = []
+        for path in ('/api', '/apis'):
+            doc = self._get(path, accept=DISCOVERY_ACCEPT)
+            if doc.get('kind') == 'APIGroupDiscoveryList':
+                resources.extend(self._parse_aggregated(doc))
+            elif path == '/api':
+                group_versions.extend(('', version) for version in doc.get('versions') or ()
+                                      if version == 'v1')
+            else:
+                for group in doc.get('groups') or ():
+                    preferred = group.get('preferredVersion') or (group.get('versions') or [{}])[0]
+                    if preferred.get('version'):
+                        group_versions.append((group['name'], preferred['version']))
+
+        if group_versions:
+            # one request per group, so read them concurrently. Warnings are printed from this thread, which
+            # has the client context that --contexts output is prefixed with
+            with ThreadPoolExecutor(max_workers=LIST_WORKERS) as executor:
+                for group_resources, warning in executor.map(self._discover_group_version, group_versions):
+                    resources.extend(group_resources)
+                    if warning:
+                        print(warning)
+        return resources
+
+    def _discover_group_version(self, group_version):
+        """
+        Reads the (non-aggregated) resource list of one API group version
+        :return: a tuple of (list of ApiResources, a warning to print or None)
+        """
+        group, version = group_version
+        path = '/apis/{}/{}'.format(group, version) if group else '/api/{}'.format(version)
+        try:
+            doc = self._get(path)
+        except client.rest.ApiException as ae:
+            # aggregated API servers (i.e. metrics-server) may be unavailable, skip their groups
+            return [], "Skipping API group '{}': {} {}".format(group or 'core', ae.status, ae.reason)
+        return [ApiResource(group, version, r['name'], r.get('kind'), bool(r.get('namespaced')),
+                            tuple(r.get('verbs') or ()))
+                for r in doc.get('resources') or () if '/' not in r['name']], None
+
+    @staticmethod
+    def _parse_aggregated(doc):
+        """
+        Parses an APIGroupDiscoveryList, whose versions are listed most preferred first
+        """
+        resources = []
+        for group in doc.get('items') or ():
+            versions = group.get('versions') or []
+            if not versions:
+                continue
+            name = (group.get('metadata') or {}).get('name') or ''
+            preferred = versions[0]
+            for r in preferred.get('resources') or ():
+                resources.append(ApiResource(name, preferred['version'], r['resource'],
+                                             (r.get('responseKind') or {}).get('kind'),
+                                             r.get('scope') == 'Namespaced', tuple(r.get('verbs') or ())))
+        return resources
+
+    def _cache_path(self):
+        import hashlib
+        host = self._ctx.api_client.configuration.host
+        return os.path.join(REGISTRY_CACHE_DIR,
+                            'discovery-{}.json'.format(hashlib.md5(host.encode('utf-8')).hexdigest()))
+
+    def _load(self):
+        """
+        :return: a tuple of (fetched time, resources) from the disk cache, or None if it's missing or stale
+        """
+        cached = _read_cache_file(self._cache_path())
+        if not isinstance(cached, dict) or time.time() - cached.get('fetched', 0) > self.ttl:
+            return None
+        try:
+            return cached['fetched'], [ApiResource(group, version, name, kind, namespaced, tuple(verbs))
+                                       for group, version, name, kind, namespaced, verbs in cached['resources']]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _save(self, fetched, resources):
+        _write_cache_file(self._cache_path(), {'fetched': fetched, 'resources': [list(r) for r in resources]})
+
+
+class ObjectCache(object):
+    """
+    In-process cache of services, pods, PVCs and PVs indexed by name and namespace, so repeated shortname
+    lookups don't each list the whole cluster. Each kind is listed the first time it's needed and listed again
+    once its entries are older than the TTL
+    """
+
+    def __init__(self, ctx, ttl=None):
+        """
+        :param ctx: the K8sClientContext used to list objects
+        :param ttl: seconds before a kind is listed again, defaults to CACHE_TTL_SECONDS
+        """
+        self._ctx = ctx
+        self.ttl = CACHE_TTL_SECONDS if ttl is None else ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _index(self, kind):
+        """
+        Gets the (by namespace/name, by name) indexes for a kind, listing the objects if they are missing or stale
+        """
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                by_key = {}
+                by_name = {}
+                list_func = getattr(self._ctx.core_v1(), CACHE_KINDS[kind])
+                for item in iterate_list(list_func, raw=True):
+                    by_key[(item.metadata.namespace, item.metadata.name)] = item
+                    by_name.setdefault(item.metadata.name, []).append(item)
+                entry = (time.time(), by_key, by_name)
+                self._entries[kind] = entry
+            return entry[1], entry[2]
+
+    def get(self, kind, name, namespace=None):
+        """
+        Gets the objects with exactly this name
+        :param kind: one of the keys of CACHE_KINDS
+        :param name: the object's name
+        :param namespace: only return the object in this namespace
+        :return: a list of matching objects
+        """
+        by_key, by_name = self._index(kind)
+        if namespace:
+            item = by_key.get((namespace, name))
+            return [item] if item is not None else []
+        return list(by_name.get(name, []))
+
+    def find(self, kind, name=None, namespace=None, exact=False, ignore_case=False):
+        """
+        Finds objects by name or any portion of their name
+        :param kind: one of the keys of CACHE_KINDS
+        :param name: the object's name, or any unique portion of it when exact is False
+        :param namespace: only return objects in this namespace
+        :param exact: match the name exactly
+        :param ignore_case: ignore case when substring matching the name
+        :return: a generator of matching objects
+        """
+        if name and exact:
+            for item in self.get(kind, name, namespace):
+                yield item
+            return
+
+        _, by_name = self._index(kind)
+        match = name.lower() if name and ignore_case else name
+        for item_name, items in list(by_name.items()):
+            if match and match not in (item_name.lower() if ignore_case else item_name):
+                continue
+            for item in items:
+                if not namespace or item.metadata.namespace == namespace:
+                    yield item
+
+    def discard(self, kind, name, namespace=None):
+        """
+        Removes an object from the cache, i.e. after deleting it
+        """
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is None:
+                return
+            _, by_key, by_name = entry
+            by_key.pop((namespace, name), None)
+            remaining = [i for i in by_name.get(name, []) if i.metadata.namespace != namespace]
+            if remaining:
+                by_name[name] = remaining
+            else:
+                by_name.pop(name, None)
+
+    def invalidate(self, kind=None):
+        """
+        Drops a kind (or every kind) from the cache so it's listed again on next use
+        """
+        with self._lock:
+            if kind:
+                self._entries.pop(kind, None)
+            else:
+                self._entries.clear()
+
+
+_client_context = None
+_client_context_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def get_client_context():
+    """
+    Gets the client context for the current thread, falling back to the process-wide context
+    which is created on first use
+    :return: a K8sClientContext
+    """
+    ctx = getattr(_thread_local, 'client_context', None)
+    if ctx is not None:
+        return ctx
+
+    global _client_context
+    if _client_context is None:
+        with _client_context_lock:
+            if _client_context is None:
+                _client_context = K8sClientContext()
+    return _client_context
+
+
+def set_client_context(ctx):
+    """
+    Replaces the process-wide client context, i.e. to inject a context backed by a fake ApiClient in tests
+    :param ctx: the K8sClientContext to use, or None to reset to a freshly loaded kubeconfig on next use
+    """
+    global _client_context
+    with _client_context_lock:
+        _client_context = ctx
+
+
+@contextmanager
+def use_client_context(ctx):
+    """
+    Temporarily overrides the client context for the current thread only
+    :param ctx: the K8sClientContext to use within the 'with' block
+    """
+    previous = getattr(_thread_local, 'client_context', None)
+    _thread_local.client_context = ctx
+    try:
+        yield ctx
+    finally:
+        _thread_local.client_context = previous
+
+
+# Maps the kinds supported by find_objects() to their (namespaced, all namespaces) list functions on CoreV1Api
+LOOKUP_KINDS = {
+    'pod': ('list_namespaced_pod', 'list_pod_for_all_namespaces'),
+    'service': ('list_namespaced_service', 'list_service_for_all_namespaces'),
+    'pvc': ('list_namespaced_persistent_volume_claim', 'list_persistent_volume_claim_for_all_namespaces'),
+}
+
+# The fields available on the SlimObjects returned by raw list calls
+SLIM_FIELDS = {
+    'metadata.name', 'metadata.namespace', 'metadata.labels', 'metadata.resource_version',
+    'spec.claim_ref', 'spec.claim_ref.name', 'spec.claim_ref.namespace', 'spec.node_name',
+    'status.pod_ip', 'status.phase'
+}
+
+# Maps the kinds held by ObjectCache to the CoreV1Api function that lists them across the whole cluster
+CACHE_KINDS = {
+    'pod': 'list_pod_for_all_namespaces',
+    'service': 'list_service_for_all_namespaces',
+    'pvc': 'list_persistent_volume_claim_for_all_namespaces',
+    'pv': 'list_persistent_volume',
+}
+
+
+""" 
+--------------------------
+      LIST FUNCTIONS 
+--------------------------    
+"""
+
+
+def iterate_list(list_func, page_size=None, raw=False, **kwargs):
+    """
+    Iterates over the items returned by a Kubernetes list call one page at a time using limit/continue,
+    so the whole list is never held in memory and callers can stop as soon as they find what they need
+    :param list_func: the list function to call (i.e. v1.list_pod_for_all_namespaces)
+    :param page_size: the maximum number of items to request per page, defaults to LIST_PAGE_SIZE
+    :param raw: skip deserializing the response into model objects, and yield SlimObjects instead
+    :param kwargs: any other arguments for the list function (i.e. namespace, label_selector)
+    :return: a generator of the listed items
+    """
+    kwargs['limit'] = page_size or LIST_PAGE_SIZE
+    if raw:
+        kwargs['_preload_content'] = False
+
+    while True:
+        if raw:
+            page = _json_loads(list_func(**kwargs).data)
+            for item in page.get('items') or ():
+                yield SlimObject.from_dict(item)
+            continue_token = (page.get('metadata') or {}).get('continue')
+        else:
+            page = list_func(**kwargs)
+            for item in page.items:
+                yield item
+            continue_token = page.metadata._continue
+
+        if not continue_token:
+            return
+        kwargs['_continue'] = continue_token
+
+
+def iterate_metadata(resource, namespace, page_size=None, ctx=None, as_dicts=False, full=False):
+    """
+    Iterates over the objects of any resource (built-in or CRD) in a namespace one page at a time, asking the
+    API server for only their metadata (PartialObjectMetadataList) rather than the full objects
+    :param resource: the ApiResource to list
+    :param namespace: the namespace to list
+    :param page_size: the maximum number of items to request per page, defaults to LIST_PAGE_SIZE
+    :param ctx: the K8sClientContext to use, defaults to get_client_context()
+    :param as_dicts: yield the decoded JSON objects, with all of their metadata, instead of SlimObjects
+    :param full: list the full objects (spec, status, etc.) instead of only their metadata
+    :return: a generator of SlimObjects, or of dictionaries when as_dicts is set
+    """
+    dynamic_client = (ctx or get_client_context()).dynamic
+    path = resource.path(namespace)
+    accept = 'application/json' if full else METADATA_LIST_ACCEPT
+    kwargs = {'limit': page_size or LIST_PAGE_SIZE}
+
+    while True:
+        response = dynamic_client.request('get', path, header_params={'Accept': accept}, serialize=False,
+                                          **kwargs)
+        page = _json_loads(response.data)
+        for item in page.get('items') or ():
+            yield item if as_dicts else SlimObject.from_dict(item)
+
+        continue_token = (page.get('metadata') or {}).get('continue')
+        if not continue_token:
+            return
+        kwargs['_continue'] = continue_token
+
+
+class SlimObjectMeta(object):
+    __slots__ = ('name', 'namespace', 'labels', 'resource_version')
+
+    def __init__(self, name=None, namespace=None, labels=None, resource_version=None):
+        self.name = name
+        self.namespace = namespace
+        self.labels = labels
+        self.resource_version = resource_version
+
+
+class SlimObjectReference(object):
+    __slots__ = ('name', 'namespace')
+
+    def __init__(self, name=None, namespace=None):
+        self.name = name
+        self.namespace = namespace
+
+
+class SlimSpec(object):
+    __slots__ = ('claim_ref', 'node_name')
+
+    def __init__(self, claim_ref=None, node_name=None):
+        self.claim_ref = claim_ref
+        self.node_name = node_name
+
+
+class SlimStatus(object):
+    __slots__ = ('pod_ip', 'phase')
+
+    def __init__(self, pod_ip=None, phase=None):
+        self.pod_ip = pod_ip
+        self.phase = phase
+
+
+class SlimObject(object):
+    """
+    A lightweight stand-in for a Kubernetes model object (V1Pod, V1PersistentVolume, etc.) holding only the
+    handful of fields this script reads (see SLIM_FIELDS). The attribute names match the model objects,
+    so i.metadata.name, i.status.pod_ip and i.spec.claim_ref.name work the same on both
     """
-    Iterates through the entire Kubernetes Python Client and grabs all
-    functions that contain 'list_namespaced' in their name
+    __slots__ = ('metadata', 'spec', 'status')
+
+    def __init__(self, metadata, spec, status):
+        self.metadata = metadata
+        self.spec = spec
+        self.status = status
+
+    @classmethod
+    def from_dict(cls, item):
+        """
+        Builds a SlimObject from an object in a raw JSON API response
+        :param item: the decoded JSON object
+        :return: a SlimObject
+        """
+        meta = item.get('metadata') or {}
+        spec = item.get('spec') or {}
+        status = item.get('status') or {}
+
+        claim_ref = spec.get('claimRef')
+        if claim_ref is not None:
+            claim_ref = SlimObjectReference(claim_ref.get('name'), claim_ref.get('namespace'))
+
+        return cls(SlimObjectMeta(meta.get('name'), meta.get('namespace'), meta.get('labels'),
+                                  meta.get('resourceVersion')),
+                   SlimSpec(claim_ref, spec.get('nodeName')),
+                   SlimStatus(status.get('podIP'), status.get('phase')))
+
+
+def find_objects(kind, name=None, namespace=None, label_selector=None, field_selector=None, exact=False,
+                 ignore_case=False, use_cache=True, raw=True):
     """
-    list_functions = []
+    Finds pods, services or PVCs, pushing as much of the filtering as possible to the API server using
+    namespace scoping, label selectors and field selectors. Substring matching on the name is only
+    done locally when exact is False. Plain name lookups across all namespaces are answered from the
+    context's ObjectCache, lookups in a namespace are always listed in just that namespace
+    :param kind: one of the keys of LOOKUP_KINDS ('pod', 'service' or 'pvc')
+    :param name: the object's name, or any unique portion of it when exact is False
+    :param namespace: only search this namespace
+    :param label_selector: label selector passed to the API server (i.e. 'app=consul')
+    :param field_selector: field selector passed to the API server (i.e. 'status.phase=Running')
+    :param exact: match the name exactly with a metadata.name field selector
+    :param ignore_case: ignore case when substring matching the name
+    :param use_cache: answer lookups without a namespace or selectors from the ObjectCache instead of listing
+    :param raw: yield SlimObjects rather than full model objects (cached objects are always SlimObjects)
+    :return: a generator of matching objects
+    """
+    ctx = get_client_context()
+    # the cache holds every namespace, so filling it would undo the namespace scoping
+    if use_cache and not namespace and not label_selector and not field_selector:
+        for item in ctx.cache.find(kind, name, exact=exact, ignore_case=ignore_case):
+            yield item
+        return
 
-    for i in dir(client):
-        m = globals()['client']
-        f = getattr(m, i)
-        members = getmembers(f)
-        for ob in members:
-            fu = ob[1]
-            if isfunction(fu):
-                name = fu.__name__
-                if re.match(r'list_namespaced_.*', name):
-                    if 'http_info' not in name:
-                        list_functions.append(fu)
+    v1 = ctx.core_v1()
+    namespaced_func, all_namespaces_func = LOOKUP_KINDS[kind]
 
-    for lf in list_functions:
-        print("{} -- {}".format(lf.__name__, lf.__module__))
+    kwargs = {}
+    if namespace:
+        list_func = getattr(v1, namespaced_func)
+        kwargs['namespace'] = namespace
+    else:
+        list_func = getattr(v1, all_namespaces_func)
+
+    field_selectors = [field_selector] if field_selector else []
+    if name and exact:
+        field_selectors.append('metadata.name={}'.format(name))
+    if field_selectors:
+        kwargs['field_selector'] = ','.join(field_selectors)
+    if label_selector:
+        kwargs['label_selector'] = label_selector
+
+    match = name.lower() if name and ignore_case else name
+    for item in iterate_list(list_func, raw=raw, **kwargs):
+        if match and not exact:
+            item_name = item.metadata.name.lower() if ignore_case else item.metadata.name
+            if match not in item_name:
+                continue
+        yield item
+
+
+def find_object(kind, shortname=None, namespace=None, label_selector=None, field_selector=None, ignore_case=False):
+    """
+    Finds the first object whose name matches the shortname. The exact name is tried first with a field selector,
+    and only if nothing matches are objects listed and matched on any portion of their name
+    :param kind: one of the keys of LOOKUP_KINDS ('pod', 'service' or 'pvc')
+    :param shortname: the object's name or any unique portion of it
+    :param namespace: only search this namespace
+    :param label_selector: label selector passed to the API server (i.e. 'app=consul')
+    :param field_selector: field selector passed to the API server (i.e. 'status.phase=Running')
+    :param ignore_case: ignore case when substring matching the name
+    :return: the first matching object, or None
+    """
+    attempts = (True, False) if shortname else (False,)
+    for exact in attempts:
+        for item in find_objects(kind, shortname, namespace=namespace, label_selector=label_selector,
+                                 field_selector=field_selector, exact=exact, ignore_case=ignore_case):
+            return item
+    return None
 
 
 """ 
@@ -124,25 +1067,21 @@ def get_all_k8s_list_namespaced_functions():
 """
 
 
-def get_pod_name_namespace(pod_shortname):
+def get_pod_name_namespace(pod_shortname, namespace=None, label_selector=None):
     """
     Gets the fully qualified name and namespace of a Pod using any unique portion of a pod name
     :param pod_shortname: any unqiue portion of a pod name (i.e. 'consul')
+    :param namespace: only search this namespace
+    :param label_selector: only consider pods matching this label selector (i.e. 'app=consul')
     :return: fully qualified name and namespace of a Pod
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
-
-    ret = v1.list_pod_for_all_namespaces(watch=False)
-
     pod_fqn = None
     pod_namespace = None
 
-    for i in ret.items:
-        if pod_shortname in i.metadata.name:
-            pod_fqn = i.metadata.name
-            pod_namespace = i.metadata.namespace
-            break
+    pod = find_object('pod', pod_shortname, namespace=namespace, label_selector=label_selector)
+    if pod:
+        pod_fqn = pod.metadata.name
+        pod_namespace = pod.metadata.namespace
 
     if not pod_fqn:
         print("Pod fully qualified name could not be found using provided shortname.")
@@ -153,28 +1092,41 @@ def get_pod_name_namespace(pod_shortname):
     return pod_fqn, pod_namespace
 
 
-def get_all_pods():
+def get_all_pods(output=OUTPUT_TABLE, fields=None):
     """
     Retrieves all pods in a cluster and prints the results with their respective IP addresses
+    :param output: OUTPUT_TABLE, OUTPUT_JSONL or OUTPUT_CSV
+    :param fields: the pod attributes to print, defaults to DEFAULT_POD_FIELDS
+    :raises ValueError: if any of the fields aren't V1Pod attributes
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
-    print("Listing pods with their IPs:")
-    ret = v1.list_pod_for_all_namespaces(watch=False)
-    for i in ret.items:
-        print("%s\t%s\t%s" % (i.status.pod_ip, i.metadata.namespace, i.metadata.name))
+    validate_fields(fields or (), 'V1Pod')
+    v1 = get_client_context().core_v1()
+    writer = RecordWriter(fields or DEFAULT_POD_FIELDS, output)
+    if output == OUTPUT_TABLE:
+        print("Listing pods with their IPs:")
+
+    # Only deserialize full V1Pod objects when a field outside of the slim records is requested
+    raw = all(f in SLIM_FIELDS for f in writer.fields if f != 'cluster')
+    for i in iterate_list(v1.list_pod_for_all_namespaces, raw=raw):
+        writer.write(i)
 
 
-def get_pod_information(pod_shortname):
+def get_pod_information(pod_shortname, namespace=None, label_selector=None, include_log=True, tail_lines=None,
+                        since_seconds=None):
     """
     Gets pod logs and 'describe'
     :param pod_shortname: any unique portion of a pod name (i.e. 'consul')
+    :param namespace: only search this namespace
+    :param label_selector: only consider pods matching this label selector (i.e. 'app=consul')
+    :param include_log: read the log into the result, use stream_pod_logs() instead to avoid holding it in memory
+    :param tail_lines: only read this many lines from the end of the log, defaults to POD_INFO_LOG_TAIL_LINES
+                       unless since_seconds is given
+    :param since_seconds: only read log lines newer than this many seconds
     :return: dictionary containing pod 'describe' and logs
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    v1 = get_client_context().core_v1()
 
-    pod_fqn, pod_namespace = get_pod_name_namespace(pod_shortname)
+    pod_fqn, pod_namespace = get_pod_name_namespace(pod_shortname, namespace=namespace, label_selector=label_selector)
 
     if not pod_fqn or not pod_namespace:
         print("Pod with name containing '{}' was not found, exiting...".format(pod_shortname))
@@ -182,22 +1134,156 @@ def get_pod_information(pod_shortname):
 
     pod = v1.read_namespaced_pod(pod_fqn, pod_namespace, pretty=True)
 
-    container = pod_fqn
+    log = None
+    if include_log:
+        if tail_lines is None and since_seconds is None:
+            tail_lines = POD_INFO_LOG_TAIL_LINES
+        sink = StringIO()
+        stream_pod_logs(pod_fqn, pod_namespace, container=get_main_container_name(pod), sink=sink,
+                        tail_lines=tail_lines, since_seconds=since_seconds)
+        log = sink.getvalue()
+
+    pod_details = {
+        'pod': pod,
+        'log': log
+    }
+
+    return pod_details
+
 
+def get_main_container_name(pod):
+    """
+    Gets the name of the pod's application container, skipping any audit, debug or sidecar containers
+    :param pod: a Kubernetes Pod Object
+    :return: the container name, or None if the pod only has one container
+    """
     if len(pod.spec.containers) > 1:
         for c in pod.spec.containers:
             if ('audit' not in c.name) and ('debug' not in c.name) and ('sidecar' not in c.name):
-                container = c.name
-                break
+                return c.name
+    return None
 
-    log = v1.read_namespaced_pod_log(pod_fqn, pod_namespace, container=container, limit_bytes='5000000')
 
-    pod_details = {
-        'pod': pod,
-        'log': log
+def stream_pod_logs(pod_fqn, namespace, container=None, sink=None, tail_lines=None, since_seconds=None,
+                    follow=False, prefix=None, lock=None, responses=None):
+    """
+    Streams a container's logs to a sink chunk by chunk as they arrive, rather than downloading the
+    whole log into memory first
+    :param pod_fqn: the fully qualified name of the pod
+    :param namespace: the pod's namespace
+    :param container: the container to get logs from, may be None if the pod only has one container
+    :param sink: a file-like object to write the logs to, defaults to stdout
+    :param tail_lines: only get this many lines from the end of the log
+    :param since_seconds: only get log lines newer than this many seconds
+    :param follow: keep streaming new log lines until the container stops or the user interrupts
+    :param prefix: text to put in front of every log line (i.e. the container name)
+    :param lock: a lock to hold while writing, for when several streams share one sink
+    :param responses: a list the log response is added to while it's open, so another thread can close it to
+                      stop a followed stream
+    """
+    v1 = get_client_context().core_v1()
+
+    kwargs = {
+        'follow': follow,
+        '_preload_content': False
     }
+    if container:
+        kwargs['container'] = container
+    if tail_lines is not None:
+        kwargs['tail_lines'] = tail_lines
+    if since_seconds is not None:
+        kwargs['since_seconds'] = since_seconds
+
+    writer = _LogWriter(sink or sys.stdout, prefix=prefix, lock=lock)
+    response = v1.read_namespaced_pod_log(pod_fqn, namespace, **kwargs)
+    if responses is not None:
+        responses.append(response)
+    try:
+        for chunk in response.stream(LOG_CHUNK_SIZE):
+            writer.write(chunk)
+        writer.write(b'', final=True)
+    finally:
+        response.release_conn()
+        if responses is not None:
+            responses.remove(response)
 
-    return pod_details
+
+def stream_all_container_logs(pod, sink=None, tail_lines=None, since_seconds=None, follow=False):
+    """
+    Streams the logs of every container in a pod at the same time, prefixing each line with its container name
+    :param pod: a Kubernetes Pod Object
+    :param sink: a file-like object to write the logs to, defaults to stdout
+    :param tail_lines: only get this many lines from the end of each log
+    :param since_seconds: only get log lines newer than this many seconds
+    :param follow: keep streaming new log lines until the containers stop or the user interrupts
+    """
+    ctx = get_client_context()
+    lock = threading.Lock()
+    responses = []
+    errors = {}
+
+    def stream(container):
+        with use_client_context(ctx):
+            try:
+                stream_pod_logs(pod.metadata.name, pod.metadata.namespace, container=container, sink=sink,
+                                tail_lines=tail_lines, since_seconds=since_seconds, follow=follow,
+                                prefix='[{}] '.format(container), lock=lock, responses=responses)
+            except Exception as e:
+                errors[container] = e
+
+    # Daemon threads, since a followed stream only ends when the container stops, and Ctrl-C mustn't wait for it
+    threads = [threading.Thread(target=stream, args=(c.name,), name='logs-{}'.format(c.name), daemon=True)
+               for c in pod.spec.containers]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        # closing the connections ends the blocked reads, so the threads stop streaming
+        for response in list(responses):
+            response.close()
+        raise
+
+    for c in pod.spec.containers:
+        error = errors.get(c.name)
+        if isinstance(error, client.rest.ApiException):
+            print("Could not get logs for container '{}': {}".format(c.name, error.reason))
+        elif error is not None:
+            raise error
+
+
+class _LogWriter(object):
+    """
+    Decodes log chunks and writes them to a sink as they arrive. When a prefix is given only whole lines are
+    written, so that lines from several containers sharing a sink don't get interleaved
+    """
+
+    def __init__(self, sink, prefix=None, lock=None):
+        self._sink = sink
+        self._prefix = prefix
+        self._lock = lock or threading.Lock()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ''
+
+    def write(self, chunk, final=False):
+        text = self._decoder.decode(chunk, final)
+
+        if self._prefix is not None:
+            text = self._partial + text
+            if final:
+                self._partial = ''
+            else:
+                end = text.rfind('\n') + 1
+                text, self._partial = text[:end], text[end:]
+            text = ''.join(self._prefix + line for line in text.splitlines(True))
+            if final and text and not text.endswith('\n'):
+                text += '\n'
+
+        if text:
+            with self._lock:
+                self._sink.write(text)
+                self._sink.flush()
 
 
 """ 
@@ -207,55 +1293,124 @@ def get_pod_information(pod_shortname):
 """
 
 
-def delete_persistent_data_objects_by_pvc_name(pvc_name):
+class PvBindingIndex(object):
+    """
+    Maps PVCs (namespace and claim name) to the PVs bound to them. It is built from a single list of PVs and
+    reused for every PVC in an operation, rather than listing and scanning all PVs for each PVC
+    """
+
+    def __init__(self, pvs):
+        """
+        :param pvs: iterable of PersistentVolume objects
+        """
+        self._by_claim = {}
+        self.unbound = []
+        for pv in pvs:
+            claim_ref = pv.spec.claim_ref
+            if claim_ref is None or not claim_ref.name:
+                self.unbound.append(pv)
+            else:
+                self._by_claim.setdefault((claim_ref.namespace, claim_ref.name), []).append(pv)
+
+    @classmethod
+    def build(cls):
+        """
+        Lists every PV in the cluster once and indexes them by their bound PVC
+        :return: a PvBindingIndex
+        """
+        v1 = get_client_context().core_v1()
+        return cls(iterate_list(v1.list_persistent_volume, raw=True))
+
+    def get(self, claim_name, namespace=None):
+        """
+        Gets the PVs bound to the PVC with exactly this name
+        :param claim_name: the PVC's name
+        :param namespace: the PVC's namespace, if None PVCs with this name in any namespace match
+        :return: a list of PVs
+        """
+        if namespace:
+            return list(self._by_claim.get((namespace, claim_name), []))
+        return [pv for (ns, name), pvs in self._by_claim.items() if name == claim_name for pv in pvs]
+
+    def find(self, claim_name=None, namespace=None):
+        """
+        Gets the PVs bound to PVCs whose name contains claim_name
+        :param claim_name: any portion of the PVC's name, if None all PVCs match
+        :param namespace: only match PVCs in this namespace
+        :return: a list of PVs
+        """
+        return [pv for (ns, name), pvs in self._by_claim.items()
+                if (not namespace or ns == namespace) and (not claim_name or claim_name in name)
+                for pv in pvs]
+
+
+def delete_persistent_data_objects_by_pvc_name(pvc_name, namespace=None, label_selector=None, exact=False,
+                                               binding_index=None):
     """
     Delete PVCs and their related PVs using a unique portion of the PVC name
     :param pvc_name: a unique portion of the PVC name (i.e. 'consul')
+    :param namespace: only delete PVCs (and PVs bound to PVCs) in this namespace
+    :param label_selector: only delete PVCs matching this label selector
+    :param exact: only delete the PVC whose name is exactly pvc_name
+    :param binding_index: a PvBindingIndex to reuse, one is built if not provided
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    ctx = get_client_context()
+    v1 = ctx.core_v1()
 
-    pvc_found = False
-
-    pvcs = v1.list_persistent_volume_claim_for_all_namespaces()
-    for i in pvcs.items:
-        if pvc_name in i.metadata.name:
-            pvc_found = True
-            pvc_fqn = i.metadata.name
-            namespace = i.metadata.namespace
-            print("Deleting PersistentVolumeClaim: \n- name: {}  \n- namespace: {}".format(pvc_fqn, namespace))
-            v1.delete_namespaced_persistent_volume_claim(pvc_fqn, namespace)
-            verify_persistent_data_object_deletion(PV_TYPE_PVC, name=pvc_fqn, namespace=namespace)
+    deleted_pvcs = []
 
-    if not pvc_found:
+    pvcs = list(find_objects('pvc', pvc_name, namespace=namespace, label_selector=label_selector, exact=exact))
+    for i in pvcs:
+        pvc_fqn = i.metadata.name
+        pvc_namespace = i.metadata.namespace
+        print("Deleting PersistentVolumeClaim: \n- name: {}  \n- namespace: {}".format(pvc_fqn, pvc_namespace))
+        try:
+            v1.delete_namespaced_persistent_volume_claim(pvc_fqn, pvc_namespace)
+        except client.rest.ApiException as ae:
+            # The PVC may have been removed since it was cached
+            if ae.status != 404:
+                raise ae
+            print("- PVC was already deleted.")
+        ctx.cache.discard('pvc', pvc_fqn, pvc_namespace)
+        deleted_pvcs.append((PV_TYPE_PVC, pvc_fqn, pvc_namespace))
+
+    if deleted_pvcs:
+        wait_for_persistent_data_object_deletion(deleted_pvcs)
+    else:
         print("Persistent Volume Claim containing '{}' not found - no need to delete".format(pvc_name))
 
-    pvs = v1.list_persistent_volume()
-
-    pv_found = False
+    deleted_pvs = []
 
     print("\nChecking for PVs that are bound to this PVC...")
-    for i in pvs.items:
-        if pvc_name in i.spec.claim_ref.name:
-            pv_found = True
-            pv_fqn = i.metadata.name
-            print("- PV")
-            print(
-                "Deleting PersistentVolume: \n- name: {}  \n- Bound PVC: {}".format(pv_fqn, i.spec.claim_ref.name))
+    if binding_index is None:
+        binding_index = PvBindingIndex.build()
 
-            try:
-                v1.delete_persistent_volume(pv_fqn)
-            except ApiException as ae:
-                # Often times deleting the PVC that is bound to the PV will automatically trigger the PV for deletion,
-                # so our delete command might not succeed before that event happens
-                if "Not Found" in ae.reason:
-                    print("- PV was likely deleted when its bound PVC was removed.")
-                else:
-                    raise ae
+    if exact:
+        bound_pvs = binding_index.get(pvc_name, namespace)
+    else:
+        bound_pvs = binding_index.find(pvc_name, namespace)
 
-            verify_persistent_data_object_deletion(PV_TYPE_PV, name=pv_fqn)
+    for i in bound_pvs:
+        pv_fqn = i.metadata.name
+        print("- PV")
+        print("Deleting PersistentVolume: \n- name: {}  \n- Bound PVC: {}".format(pv_fqn, i.spec.claim_ref.name))
 
-    if not pv_found:
+        try:
+            v1.delete_persistent_volume(pv_fqn)
+        except client.rest.ApiException as ae:
+            # Often times deleting the PVC that is bound to the PV will automatically trigger the PV for deletion,
+            # so our delete command might not succeed before that event happens
+            if "Not Found" in ae.reason:
+                print("- PV was likely deleted when its bound PVC was removed.")
+            else:
+                raise ae
+
+        ctx.cache.discard('pv', pv_fqn)
+        deleted_pvs.append((PV_TYPE_PV, pv_fqn, None))
+
+    if deleted_pvs:
+        wait_for_persistent_data_object_deletion(deleted_pvs)
+    else:
         print("- No PVs that are bound to PVCs containing name: '{}' were found - no need to delete".format(pvc_name))
 
 
@@ -264,8 +1419,7 @@ def get_persistent_data_objects_by_namespace(namespace):
     Gets any and all PVs/PVCs in the specified namespace
     :param namespace: the namespace containing the PVs and PVCs
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    v1 = get_client_context().core_v1()
     print("Checking namespace: '{}' for Persistent Volume Claims...".format(namespace))
 
     pvcs = v1.list_namespaced_persistent_volume_claim(namespace)
@@ -276,200 +1430,565 @@ def get_persistent_data_objects_by_namespace(namespace):
         return pvcs
 
 
-def delete_persistent_data_objects_by_namespace(namespace):
+def delete_persistent_data_objects_by_namespace(namespace, binding_index=None):
     """
     Deletes any and all PVs/PVCs in the specified namespace
     :param namespace: the namespace containing the PVs and PVCs to delete
+    :param binding_index: a PvBindingIndex to reuse, one is built if not provided
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
-
     pvcs = get_persistent_data_objects_by_namespace(namespace)
 
     if pvcs:
+        if binding_index is None:
+            binding_index = PvBindingIndex.build()
         print("- Deleting all Persistent Volume Claims belonging to namespace: {}\n".format(namespace))
         for pvc in pvcs.items:
-            delete_persistent_data_objects_by_pvc_name(pvc.metadata.name)
+            delete_persistent_data_objects_by_pvc_name(pvc.metadata.name, namespace=namespace, exact=True,
+                                                       binding_index=binding_index)
 
 
 def verify_persistent_data_object_deletion(pv_type, **kwargs):
     """
-    Watches a particular PV or PVC for 30 seconds to verify it was deleted
+    Watches a particular PV or PVC for DELETION_TIMEOUT_SECONDS to verify it was deleted
     :param pv_type: PV or PVC
     :param kwargs: name (and namespace for PVCs)
+    :return: True if the object was deleted, otherwise False
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    remaining = wait_for_persistent_data_object_deletion([(pv_type, kwargs.get('name'), kwargs.get('namespace'))])
+    return not remaining
 
-    count = 30
-    metadata = ''
 
-    if 'name' in kwargs:
-        metadata += 'name={}'.format(kwargs['name'])
-    if 'namespace' in kwargs:
-        metadata += '  namespace={}'.format(kwargs['namespace'])
+def wait_for_persistent_data_object_deletion(pending, timeout=None):
+    """
+    Waits for a group of PVs and PVCs to be deleted. Rather than polling each object, a single watch per
+    object type tracks every pending deletion at once and resolves each object when its DELETED event arrives
+    :param pending: iterable of (pv_type, name, namespace) tuples, namespace should be None for PVs
+    :param timeout: seconds to wait for all objects to be deleted, defaults to DELETION_TIMEOUT_SECONDS
+    :return: list of (pv_type, name, namespace) tuples that were still present when the timeout expired
+    """
+    if timeout is None:
+        timeout = DELETION_TIMEOUT_SECONDS
+    deadline = time.time() + timeout
 
-    print("\nVerifying {} was deleted".format(pv_type), end="")
+    pending = list(pending)
+    remaining = []
 
-    for i in range(0, count):
-        print(".", end="")
-        try:
-            if pv_type == PV_TYPE_PV:
-                v1.read_persistent_volume(**kwargs)
-            elif pv_type == PV_TYPE_PVC:
-                v1.read_namespaced_persistent_volume_claim(**kwargs)
-        except ApiException as ae:
-            if "Not Found" in ae.reason:
-                print("\n- {} ({}) successfully deleted.".format(pv_type, metadata))
-                return
-        time.sleep(1)
+    for pv_type in (PV_TYPE_PVC, PV_TYPE_PV):
+        keys = set((name, namespace) for t, name, namespace in pending if t == pv_type)
+        if not keys:
+            continue
+        print("\nWaiting for {} {}(s) to be deleted...".format(len(keys), pv_type))
+        for name, namespace in sorted(_watch_for_deletion(pv_type, keys, deadline), key=str):
+            remaining.append((pv_type, name, namespace))
 
-    print("\n- Error: An issue was encountered when attempting to delete {}  ({})".format(pv_type, metadata))
+    for pv_type, name, namespace in remaining:
+        print("- Error: {} ({}) was not deleted within {} seconds".format(
+            pv_type, _describe_object(name, namespace), timeout))
 
+    return remaining
 
-def check_for_persistent_data_objects():
+
+def _watch_for_deletion(pv_type, keys, deadline):
     """
-    Checks for the existence of PersistentVolumes and PersistentVolumeClaims in the cluster
+    Watches PVs or PVCs until every (name, namespace) in keys has been deleted or the deadline passes
+    :param pv_type: PV or PVC
+    :param keys: set of (name, namespace) tuples to wait on
+    :param deadline: the time.time() value after which to stop watching
+    :return: the set of (name, namespace) tuples that were not deleted
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    v1 = get_client_context().core_v1()
 
-    pvs = v1.list_persistent_volume()
-    if len(pvs.items) > 0:
-        print("\nThere are some PersistentVolumes remaining:")
-        for i in pvs.items:
-            name = i.metadata.name
-            bound_pvc = i.spec.claim_ref.name
-            print("\nPersistentVolume: \n- name: {}  \n- Bound PVC: {}".format(name, bound_pvc))
+    list_kwargs = {}
+    if pv_type == PV_TYPE_PV:
+        list_func = v1.list_persistent_volume
     else:
-        print("No PersistentVolumes in cluster...")
+        namespaces = set(namespace for _, namespace in keys)
+        if len(namespaces) == 1:
+            list_func = v1.list_namespaced_persistent_volume_claim
+            list_kwargs['namespace'] = namespaces.pop()
+        else:
+            list_func = v1.list_persistent_volume_claim_for_all_namespaces
+
+    # Field selectors can't OR names together, so only narrow the watch when waiting on a single object
+    if len(keys) == 1:
+        list_kwargs['field_selector'] = 'metadata.name={}'.format(next(iter(keys))[0])
+
+    pending = set(keys)
+    resource_version = None
+
+    while pending and time.time() < deadline:
+        if resource_version is None:
+            # List first so objects that are already gone resolve immediately and the watch starts from a
+            # known resourceVersion without replaying old events
+            objs = list_func(**list_kwargs)
+            existing = set((i.metadata.name, i.metadata.namespace) for i in objs.items)
+            for key in pending - existing:
+                print("- {} ({}) successfully deleted.".format(pv_type, _describe_object(*key)))
+            pending &= existing
+            resource_version = objs.metadata.resource_version
+            continue
+
+        timeout_seconds = max(1, int(math.ceil(deadline - time.time())))
+        w = watch.Watch()
+        try:
+            for event in w.stream(list_func, resource_version=resource_version,
+                                  timeout_seconds=timeout_seconds, **list_kwargs):
+                obj = event['object']
+                resource_version = obj.metadata.resource_version
+                key = (obj.metadata.name, obj.metadata.namespace)
+                if event['type'] == 'DELETED' and key in pending:
+                    pending.discard(key)
+                    print("- {} ({}) successfully deleted.".format(pv_type, _describe_object(*key)))
+                if not pending or time.time() >= deadline:
+                    w.stop()
+        except client.rest.ApiException as ae:
+            # The resourceVersion we were watching from has been compacted away, start over with a fresh list
+            if ae.status == 410:
+                resource_version = None
+            else:
+                raise ae
+
+    return pending
+
+
+def _describe_object(name, namespace=None):
+    """
+    Formats an object's name and namespace for log messages
+    """
+    metadata = 'name={}'.format(name)
+    if namespace:
+        metadata += '  namespace={}'.format(namespace)
+    return metadata
 
-    pvcs = v1.list_persistent_volume_claim_for_all_namespaces()
 
-    if len(pvcs.items) > 0:
-        print("\nThere are some PersistentVolumesClaims remaining:")
-        for i in pvcs.items:
-            pvc_name = i.metadata.name
-            namespace = i.metadata.namespace
-            print("\nPersistentVolumeClaim: \n- name: {}  \n- namespace: {}".format(pvc_name, namespace))
-    else:
-        print("No PersistentVolumeClaims in cluster...")
+def check_for_persistent_data_objects():
+    """
+    Checks for the existence of PersistentVolumes and PersistentVolumeClaims in the cluster
+    """
+    v1 = get_client_context().core_v1()
 
+    pv_found = False
+    for i in iterate_list(v1.list_persistent_volume, raw=True):
+        if not pv_found:
+            print("\nThere are some PersistentVolumes remaining:")
+            pv_found = True
+        name = i.metadata.name
+        bound_pvc = i.spec.claim_ref.name if i.spec.claim_ref else None
+        print("\nPersistentVolume: \n- name: {}  \n- Bound PVC: {}".format(name, bound_pvc))
+    if not pv_found:
+        print("No PersistentVolumes in cluster...")
 
-"""
---------------------------    
-   NAMESPACE FUNCTIONS 
---------------------------    
-"""
+    pvc_found = False
+    for i in iterate_list(v1.list_persistent_volume_claim_for_all_namespaces, raw=True):
+        if not pvc_found:
+            print("\nThere are some PersistentVolumesClaims remaining:")
+            pvc_found = True
+        pvc_name = i.metadata.name
+        namespace = i.metadata.namespace
+        print("\nPersistentVolumeClaim: \n- name: {}  \n- namespace: {}".format(pvc_name, namespace))
+    if not pvc_found:
+        print("No PersistentVolumeClaims in cluster...")
 
 
-def get_all_items_in_namespace(namespace):
+class DeletionPlan(object):
     """
-    Gets all Kubernetes API Objects related to the specified namespace
-    :param namespace: the namespace to query for K8s objects
-    :return: a dictionary of all items
+    The PVCs and bound PVs that a cleanup will delete, gathered before anything is deleted
     """
-    config.load_kube_config()
-    core_v1_api = client.CoreV1Api()
-    apps_v1_api = client.AppsV1Api()
-    rbac_v1_api = client.RbacAuthorizationV1Api()
-    nets_v1_api = client.NetworkingV1beta1Api()
-    jobs_v1_api = client.BatchV1Api()
-    cjob_v1_api = client.BatchV1beta1Api()
 
-    core_v1 = {}
-    apps_v1 = {}
-    rbac_v1 = {}
-    nets_v1 = {}
-    jobs_v1 = {}
+    def __init__(self):
+        self.pvcs = []
+        self.pvs = []
+        self._pvc_keys = set()
+        self._pv_names = set()
 
-    k8s_obj_list = [core_v1, apps_v1, rbac_v1, nets_v1, jobs_v1]
+    def add_pvc(self, name, namespace):
+        if (namespace, name) not in self._pvc_keys:
+            self._pvc_keys.add((namespace, name))
+            self.pvcs.append((name, namespace))
 
-    try:
-        ns = core_v1_api.read_namespace(namespace)
-    except ApiException:
-        print("Namespace '{}' not found! Exiting script.".format(namespace))
-        return
-    if ns.status:
-        status = ns.status
-        # Verify that namespace status is active
-        if 'active' in status.phase.lower():
-            core_v1['configMaps'] = core_v1_api.list_namespaced_config_map(namespace)
-            core_v1['endpoints'] = core_v1_api.list_namespaced_endpoints(namespace)
-            core_v1['persistentVolumeClaims'] = core_v1_api.list_namespaced_persistent_volume_claim(namespace)
-            core_v1['pods'] = core_v1_api.list_namespaced_pod(namespace)
-            core_v1['podTemplates'] = core_v1_api.list_namespaced_pod_template(namespace)
-            core_v1['replicationControllers'] = core_v1_api.list_namespaced_replication_controller(namespace)
-            core_v1['resourceQuotas'] = core_v1_api.list_namespaced_resource_quota(namespace)
-            core_v1['secrets'] = core_v1_api.list_namespaced_secret(namespace)
-            core_v1['serviceAccounts'] = core_v1_api.list_namespaced_service_account(namespace)
-            core_v1['services'] = core_v1_api.list_namespaced_service(namespace)
-
-            apps_v1['controllerRevisions'] = apps_v1_api.list_namespaced_controller_revision(namespace)
-            apps_v1['daemonSets'] = apps_v1_api.list_namespaced_daemon_set(namespace)
-            apps_v1['deployments'] = apps_v1_api.list_namespaced_deployment(namespace)
-            apps_v1['replicaSets'] = apps_v1_api.list_namespaced_replica_set(namespace)
-            apps_v1['statefulSets'] = apps_v1_api.list_namespaced_stateful_set(namespace)
-
-            rbac_v1['roles'] = rbac_v1_api.list_namespaced_role(namespace)
-            rbac_v1['roleBindings'] = rbac_v1_api.list_namespaced_role_binding(namespace)
-
-            nets_v1['ingresses'] = nets_v1_api.list_namespaced_ingress(namespace)
-
-            jobs_v1['jobs'] = jobs_v1_api.list_namespaced_job(namespace)
-            jobs_v1['cronJobs'] = cjob_v1_api.list_namespaced_cron_job(namespace)
+    def add_pv(self, name, claim_name=None, claim_namespace=None):
+        if name not in self._pv_names:
+            self._pv_names.add(name)
+            self.pvs.append((name, claim_name, claim_namespace))
 
-        else:
-            print("Expected namespace status to be active, instead status is '{}', exiting script.".format(status))
-            return
-    else:
-        print("An error occurred when reading the namespace '{}'. "
-              "Namespace does not contain a status field. Exiting script.".format(namespace))
-        return
+    def has_pvc(self, name, namespace):
+        return (namespace, name) in self._pvc_keys
 
-    return k8s_obj_list
+    def __len__(self):
+        return len(self.pvcs) + len(self.pvs)
 
+    def to_dict(self):
+        return {'pvcs': [list(pvc) for pvc in self.pvcs], 'pvs': [list(pv) for pv in self.pvs]}
 
-"""
---------------------------    
+    @classmethod
+    def from_dict(cls, data):
+        plan = cls()
+        for name, namespace in data.get('pvcs') or ():
+            plan.add_pvc(name, namespace)
+        for name, claim_name, claim_namespace in data.get('pvs') or ():
+            plan.add_pv(name, claim_name, claim_namespace)
+        return plan
+
+
+def plan_persistent_data_deletion(pvc_names=None, namespaces=None, binding_index=None):
+    """
+    Collects every PVC matching the PVC names or belonging to the namespaces, and every PV bound to them
+    :param pvc_names: unique portions of PVC names to delete, defaults to PVC_LIST
+    :param namespaces: namespaces whose PVCs should all be deleted, defaults to NAMESPACES
+    :param binding_index: a PvBindingIndex to reuse, one is built if not provided
+    :return: a DeletionPlan
+    """
+    if pvc_names is None:
+        pvc_names = PVC_LIST
+    if namespaces is None:
+        namespaces = NAMESPACES
+
+    plan = DeletionPlan()
+
+    for pvc_name in pvc_names:
+        for pvc in find_objects('pvc', pvc_name):
+            plan.add_pvc(pvc.metadata.name, pvc.metadata.namespace)
+
+    for namespace in namespaces:
+        for pvc in find_objects('pvc', namespace=namespace):
+            plan.add_pvc(pvc.metadata.name, pvc.metadata.namespace)
+
+    if binding_index is None:
+        binding_index = PvBindingIndex.build()
+
+    bound_pvs = []
+    for name, namespace in plan.pvcs:
+        bound_pvs.extend(binding_index.get(name, namespace))
+    for pvc_name in pvc_names:
+        bound_pvs.extend(binding_index.find(pvc_name))
+    for namespace in namespaces:
+        bound_pvs.extend(binding_index.find(namespace=namespace))
+
+    for pv in bound_pvs:
+        plan.add_pv(pv.metadata.name, pv.spec.claim_ref.name, pv.spec.claim_ref.namespace)
+
+    return plan
+
+
+def print_deletion_plan(plan):
+    """
+    Prints the PVCs and PVs in a deletion plan
+    :param plan: a DeletionPlan
+    """
+    if not plan.pvcs:
+        print("- No PersistentVolumeClaims to delete")
+    for name, namespace in plan.pvcs:
+        print("PersistentVolumeClaim: \n- name: {}  \n- namespace: {}".format(name, namespace))
+
+    if not plan.pvs:
+        print("- No PersistentVolumes to delete")
+    for name, claim_name, claim_namespace in plan.pvs:
+        print("PersistentVolume: \n- name: {}  \n- Bound PVC: {}".format(name, claim_name))
+
+
+def execute_deletion_plan(plan, parallelism=None):
+    """
+    Deletes every PVC and PV in a deletion plan concurrently, then waits for all of them to be removed together
+    :param plan: a DeletionPlan
+    :param parallelism: how many delete calls to make at once, defaults to DELETE_PARALLELISM
+    :return: a list of (pv_type, name, namespace, result, detail) tuples where result is one of
+             DELETE_RESULT_DELETED, DELETE_RESULT_ALREADY_GONE or DELETE_RESULT_FAILED
+    """
+    ctx = get_client_context()
+    v1 = ctx.core_v1()
+
+    deletions = [(PV_TYPE_PVC, name, namespace) for name, namespace in plan.pvcs]
+    deletions += [(PV_TYPE_PV, name, None) for name, _, _ in plan.pvs]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=parallelism or DELETE_PARALLELISM) as executor:
+        futures = {}
+        for pv_type, name, namespace in deletions:
+            if pv_type == PV_TYPE_PVC:
+                future = executor.submit(v1.delete_namespaced_persistent_volume_claim, name, namespace)
+            else:
+                future = executor.submit(v1.delete_persistent_volume, name)
+            futures[future] = (pv_type, name, namespace)
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+                results[key] = (DELETE_RESULT_DELETED, '')
+            except client.rest.ApiException as ae:
+                # Deleting a PVC often removes its bound PV before we get to it
+                if ae.status == 404:
+                    results[key] = (DELETE_RESULT_ALREADY_GONE, '')
+                else:
+                    results[key] = (DELETE_RESULT_FAILED, ae.reason)
+            ctx.cache.discard('pvc' if key[0] == PV_TYPE_PVC else 'pv', key[1], key[2])
+
+    pending = [key for key in deletions if results[key][0] == DELETE_RESULT_DELETED]
+    for key in wait_for_persistent_data_object_deletion(pending):
+        results[key] = (DELETE_RESULT_FAILED, 'not deleted within {} seconds'.format(DELETION_TIMEOUT_SECONDS))
+
+    return [key + results[key] for key in deletions]
+
+
+def print_deletion_summary(results):
+    """
+    Prints a table of what was deleted, what was already gone and what failed
+    :param results: the list returned by execute_deletion_plan()
+    """
+    print("\n{:<6}{:<48}{:<24}{}".format('TYPE', 'NAME', 'NAMESPACE', 'RESULT'))
+    for pv_type, name, namespace, result, detail in results:
+        if detail:
+            result = '{} ({})'.format(result, detail)
+        print("{:<6}{:<48}{:<24}{}".format(pv_type, name, namespace or '-', result))
+
+    counts = dict((r, 0) for r in (DELETE_RESULT_DELETED, DELETE_RESULT_ALREADY_GONE, DELETE_RESULT_FAILED))
+    for result in results:
+        counts[result[3]] += 1
+    print("\n{} deleted, {} already gone, {} failed".format(
+        counts[DELETE_RESULT_DELETED], counts[DELETE_RESULT_ALREADY_GONE], counts[DELETE_RESULT_FAILED]))
+
+
+"""
+--------------------------    
+   NAMESPACE FUNCTIONS 
+--------------------------    
+"""
+
+
+def get_all_items_in_namespace(namespace, max_workers=None, timings=None, on_result=None, errors=None,
+                               refresh_discovery=False, fields=None):
+    """
+    Gets all Kubernetes API Objects related to the specified namespace, for every namespaced resource the API
+    server serves, CRDs included (see ApiDiscovery). Only the objects' metadata is requested unless fields
+    need more, and the list calls for each resource are made concurrently on a bounded thread pool
+    :param namespace: the namespace to query for K8s objects
+    :param max_workers: the number of list calls to run at once, defaults to LIST_WORKERS
+    :param timings: optional dictionary that is filled with {resource: (seconds, item count)}
+    :param on_result: optional function called with (resource, list of objects) as each list call completes
+    :param errors: optional dictionary that is filled with {resource: HTTP status} for resources that are
+                   skipped because they can't be listed (not found, forbidden or not allowed)
+    :param refresh_discovery: read discovery from the API server even if it's cached
+    :param fields: the field paths the caller will read (see get_field()). When given, the objects are
+                   returned as decoded JSON dictionaries instead of SlimObjects, and the full objects are
+                   listed if any of the fields is outside of metadata
+    :return: a dictionary of {resource: list of SlimObjects (or dictionaries)}, sorted by resource, where
+             resource is the kubectl-style name (i.e. 'pods' or 'deployments.apps')
+    """
+    ctx = get_client_context()
+
+    try:
+        ns = ctx.core_v1().read_namespace(namespace)
+    except client.rest.ApiException:
+        print("Namespace '{}' not found! Exiting script.".format(namespace))
+        return
+    if not ns.status:
+        print("An error occurred when reading the namespace '{}'. "
+              "Namespace does not contain a status field. Exiting script.".format(namespace))
+        return
+    # Verify that namespace status is active
+    if 'active' not in ns.status.phase.lower():
+        print("Expected namespace status to be active, instead status is '{}', exiting script.".format(ns.status))
+        return
+
+    as_dicts = fields is not None
+    full = any(f.split('.')[0] not in RECORD_METADATA_FIELDS for f in fields or ())
+    resources = ctx.discovery.namespaced_listable(refresh=refresh_discovery)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or LIST_WORKERS) as executor:
+        futures = {}
+        for resource in resources:
+            future = executor.submit(_timed_call, _list_metadata, resource, namespace, ctx, as_dicts, full)
+            futures[future] = resource.key
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                items, elapsed = future.result()
+            except client.rest.ApiException as ae:
+                # the resource went away since discovery was cached, or this user can't list it
+                if ae.status in (403, 404, 405):
+                    if errors is not None:
+                        errors[key] = ae.status
+                    continue
+                raise
+            results[key] = items
+            if timings is not None:
+                timings[key] = (elapsed, len(items))
+            if on_result is not None:
+                on_result(key, items)
+
+    return OrderedDict((key, results[key]) for key in sorted(results))
+
+
+def _list_metadata(resource, namespace, ctx, as_dicts=False, full=False):
+    return list(iterate_metadata(resource, namespace, ctx=ctx, as_dicts=as_dicts, full=full))
+
+
+def delete_namespaces(namespaces):
+    """
+    Deletes namespaces concurrently. The API server only marks each namespace for deletion, see
+    wait_for_namespace_deletion() to wait for them to finish terminating
+    :param namespaces: the namespaces to delete
+    :return: a dictionary of {namespace: (result, detail)} where result is one of DELETE_RESULT_DELETED,
+             DELETE_RESULT_ALREADY_GONE or DELETE_RESULT_FAILED
+    """
+    if not namespaces:
+        return {}
+    v1 = get_client_context().core_v1()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(namespaces)) as executor:
+        futures = dict((executor.submit(v1.delete_namespace, namespace), namespace) for namespace in namespaces)
+        for future in as_completed(futures):
+            namespace = futures[future]
+            try:
+                future.result()
+                results[namespace] = (DELETE_RESULT_DELETED, None)
+                print("- Namespace '{}' marked for deletion.".format(namespace))
+            except client.rest.ApiException as ae:
+                if ae.status == 404:
+                    results[namespace] = (DELETE_RESULT_ALREADY_GONE, None)
+                    print("- Namespace '{}' does not exist.".format(namespace))
+                else:
+                    results[namespace] = (DELETE_RESULT_FAILED, '{} {}'.format(ae.status, ae.reason))
+                    print("- Error: Namespace '{}' could not be deleted: {} {}".format(
+                        namespace, ae.status, ae.reason))
+    return results
+
+
+def wait_for_namespace_deletion(namespaces, timeout=None):
+    """
+    Waits for namespaces to finish terminating using a single watch. Namespaces still present when the timeout
+    expires are returned with what's holding them up: the finalizers and content the namespace controller
+    reports it's still waiting on
+    :param namespaces: the namespaces to wait on
+    :param timeout: seconds to wait for all namespaces, defaults to NAMESPACE_DELETION_TIMEOUT_SECONDS
+    :return: a dictionary of {namespace: list of reasons} for the namespaces that were not deleted
+    """
+    if timeout is None:
+        timeout = NAMESPACE_DELETION_TIMEOUT_SECONDS
+    deadline = time.time() + timeout
+    v1 = get_client_context().core_v1()
+
+    pending = set(namespaces)
+    last_seen = {}
+    resource_version = None
+
+    while pending and time.time() < deadline:
+        if resource_version is None:
+            objs = v1.list_namespace()
+            existing = set()
+            for ns in objs.items:
+                if ns.metadata.name in pending:
+                    existing.add(ns.metadata.name)
+                    last_seen[ns.metadata.name] = ns
+            for name in sorted(pending - existing):
+                print("- Namespace '{}' successfully deleted.".format(name))
+            pending &= existing
+            resource_version = objs.metadata.resource_version
+            continue
+
+        timeout_seconds = max(1, int(math.ceil(deadline - time.time())))
+        w = watch.Watch()
+        try:
+            for event in w.stream(v1.list_namespace, resource_version=resource_version,
+                                  timeout_seconds=timeout_seconds):
+                ns = event['object']
+                resource_version = ns.metadata.resource_version
+                name = ns.metadata.name
+                if name in pending:
+                    if event['type'] == 'DELETED':
+                        pending.discard(name)
+                        print("- Namespace '{}' successfully deleted.".format(name))
+                    else:
+                        last_seen[name] = ns
+                if not pending or time.time() >= deadline:
+                    w.stop()
+        except client.rest.ApiException as ae:
+            # The resourceVersion we were watching from has been compacted away, start over with a fresh list
+            if ae.status == 410:
+                resource_version = None
+            else:
+                raise ae
+
+    stuck = dict((name, _namespace_blockers(last_seen.get(name))) for name in pending)
+    for name in sorted(stuck):
+        print("- Error: Namespace '{}' was not deleted within {} seconds".format(name, timeout))
+        for reason in stuck[name]:
+            print("    {}".format(reason))
+    return stuck
+
+
+def _namespace_blockers(ns):
+    """
+    Describes what a terminating namespace is waiting on, from its finalizers and status conditions
+    (i.e. NamespaceFinalizersRemaining, NamespaceContentRemaining)
+    :return: a list of reasons
+    """
+    if ns is None:
+        return []
+    reasons = []
+    for condition in (ns.status.conditions if ns.status else None) or ():
+        if condition.status == 'True' and condition.type.startswith('Namespace'):
+            reasons.append('{}: {}'.format(condition.type, condition.message))
+    if ns.spec and ns.spec.finalizers:
+        reasons.append('spec.finalizers: {}'.format(', '.join(ns.spec.finalizers)))
+    if ns.metadata.finalizers:
+        reasons.append('metadata.finalizers: {}'.format(', '.join(ns.metadata.finalizers)))
+    return reasons
+
+
+def _timed_call(func, *args, **kwargs):
+    """
+    Calls a function and measures how long it took
+    :return: a tuple of the function's result and the elapsed time in seconds
+    """
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+"""
+--------------------------    
     SERVICE FUNCTIONS 
 --------------------------    
 """
 
 
-def get_service_name_namespace(service_shortname):
+def get_service_name_namespace(service_shortname, namespace=None, label_selector=None):
     """
     Gets the name and namespace of a service containing the service shortname
     :param service_shortname: a unique portion of the service name
+    :param namespace: only search this namespace
+    :param label_selector: only consider services matching this label selector
     :return: the service's name and namespace
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
-
     name = None
-    namespace = None
+    namespace_found = None
 
-    services = v1.list_service_for_all_namespaces()
-    for i in services.items:
-        if service_shortname.lower() in i.metadata.name.lower():
-            name = i.metadata.name
-            namespace = i.metadata.namespace
+    service = find_object('service', service_shortname, namespace=namespace, label_selector=label_selector,
+                          ignore_case=True)
+    if service:
+        name = service.metadata.name
+        namespace_found = service.metadata.namespace
 
-    if not name or not namespace:
+    if not name or not namespace_found:
         print("Service matching the shortname '{}' could not be found!".format(service_shortname))
 
-    return name, namespace
+    return name, namespace_found
 
 
-def get_service_object(service_shortname):
+def get_service_object(service_shortname, namespace=None, label_selector=None):
     """
     Get the service object whose name contains the service_shortname provided
     :param service_shortname: a unique portion of the service name
+    :param namespace: only search this namespace
+    :param label_selector: only consider services matching this label selector
     :return: a Kubernetes Service Object
     """
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
-    name, namespace = get_service_name_namespace(service_shortname)
+    v1 = get_client_context().core_v1()
+    name, namespace = get_service_name_namespace(service_shortname, namespace=namespace,
+                                                 label_selector=label_selector)
 
     return v1.read_namespaced_service(name, namespace)
 
@@ -504,8 +2023,7 @@ def get_node_hostname():
     """
     volumes_hostname = ""
 
-    config.load_kube_config()
-    v1 = client.CoreV1Api()
+    v1 = get_client_context().core_v1()
     kobj = v1.list_node()
 
     if len(kobj.items) == 1:
@@ -523,8 +2041,7 @@ def get_default_storage_class():
     Gets the default storage class of the cluster
     :return: the default storage class of the cluster
     """
-    config.load_kube_config()
-    v1 = client.StorageV1Api()
+    v1 = get_client_context().storage_v1()
 
     sc = v1.list_storage_class()
     for i in sc.items:
@@ -532,11 +2049,25 @@ def get_default_storage_class():
             return i.metadata.name
 
 
-def clear_pg_database():
+"""
+--------------------------    
+    POSTGRES FUNCTIONS 
+--------------------------    
+"""
+
+
+def get_pg_connection_settings(refresh=False):
     """
-    This will clear a Postgres Database (if exists in the namespace) of all data while retaining the tables and databases
+    Resolves the Postgres connection parameters from the environment and the Postgres service's port.
+    They're resolved once per cluster and saved on the client context, so the service port is only looked up
+    the first time and each cluster gets its own port
+    :param refresh: resolve the parameters again instead of using the saved ones
+    :return: a dictionary of psycopg2.connect() keyword arguments
     """
-    print("- Cleaning up Postgres Database...")
+    ctx = get_client_context()
+    if ctx.pg_connection_settings is not None and not refresh:
+        return dict(ctx.pg_connection_settings)
+
     host = get_env_var_or_default('localhost', 'PGHOST', 'PGHOSTADDR')
     database = get_env_var_or_default('postgres', 'PGDATABASE')
     username = get_env_var_or_default('postgres', 'POSTGRES_USER', 'PGUSER')
@@ -551,42 +2082,1235 @@ def clear_pg_database():
         print("Couldn't get Postgres service port due to exception:  {},  using default port".format(e))
         port = None
     if not port:
-        port = get_env_var_or_default('PGPORT', 5432)
+        port = get_env_var_or_default(5432, 'PGPORT')
+
+    ctx.pg_connection_settings = {
+        'host': host,
+        'port': port,
+        'database': database,
+        'user': username,
+        'password': password
+    }
+    return dict(ctx.pg_connection_settings)
+
+
+class PgConnectionPools(object):
+    """
+    A small pool of Postgres connections per database, all sharing one set of connection parameters
+    """
 
+    def __init__(self, settings=None, max_connections=1):
+        """
+        :param settings: psycopg2.connect() keyword arguments, defaults to get_pg_connection_settings()
+        :param max_connections: the most connections to keep open to each database. reset_pg_databases() only
+                                ever borrows one connection per database at a time, so one is enough there
+        """
+        self.settings = settings or get_pg_connection_settings()
+        self.max_connections = max_connections
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, database):
+        with self._lock:
+            pool = self._pools.get(database)
+            if pool is None:
+                settings = dict(self.settings, database=database)
+                pool = psycopg2.pool.ThreadedConnectionPool(0, self.max_connections, **settings)
+                self._pools[database] = pool
+            return pool
+
+    @contextmanager
+    def connection(self, database=None):
+        """
+        Borrows a connection to a database for the duration of a 'with' block. Anything left uncommitted
+        is rolled back before the connection is returned to the pool
+        :param database: the database to connect to, defaults to the one in the connection settings
+        """
+        pool = self._pool(database or self.settings['database'])
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            pool.putconn(conn)
+
+    def close(self):
+        """
+        Closes every pooled connection
+        """
+        with self._lock:
+            for pool in self._pools.values():
+                pool.closeall()
+            self._pools = {}
+
+
+def list_pg_databases(pools):
+    """
+    Lists every database that can be connected to, skipping the template databases
+    :param pools: a PgConnectionPools
+    :return: a list of database names
+    """
+    with pools.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT datname FROM pg_database WHERE NOT datistemplate AND datallowconn ORDER BY datname")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def list_pg_tables(cursor, schemas=None):
+    """
+    Lists the tables in a database along with the planner's estimate of how many rows each holds
+    :param cursor: a cursor for the database
+    :param schemas: only list tables in these schemas, defaults to every non-system schema
+    :return: a list of (schema, table, estimated rows) tuples
+    """
+    statement = "SELECT t.table_schema, t.table_name, COALESCE(s.n_live_tup, 0) " \
+                "FROM information_schema.tables t " \
+                "LEFT JOIN pg_stat_user_tables s ON s.schemaname = t.table_schema AND s.relname = t.table_name " \
+                "WHERE t.table_type = 'BASE TABLE' " \
+                "AND t.table_schema <> 'information_schema' AND t.table_schema !~ '^pg_'"
+    params = None
+    if schemas:
+        statement += " AND t.table_schema IN %s"
+        params = (tuple(schemas),)
+    cursor.execute(statement + " ORDER BY t.table_schema, t.table_name", params)
+    return cursor.fetchall()
+
+
+def clear_pg_tables(cursor, tables, mode=PG_RESET_TRUNCATE, replica_role=False, verbose=False):
+    """
+    Removes all data from the given tables in the cursor's current transaction
+    :param cursor: a cursor for the database
+    :param tables: a list of (schema, table) tuples
+    :param mode: PG_RESET_TRUNCATE to TRUNCATE every table in one statement, or PG_RESET_DELETE
+                 to run 'DELETE FROM' on each table
+    :param replica_role: set session_replication_role to 'replica' for the transaction, which skips triggers
+                         (including foreign key checks) while clearing, requires superuser
+    :param verbose: print each statement before running it
+    :return: the number of rows deleted when mode is PG_RESET_DELETE (0 if there are no tables), otherwise None
+             since TRUNCATE doesn't report a row count
+    """
+    identifiers = [sql.Identifier(schema, table) for schema, table in tables]
+    if not identifiers:
+        return 0 if mode == PG_RESET_DELETE else None
+
+    if replica_role:
+        cursor.execute("SET LOCAL session_replication_role = replica")
+
+    if mode == PG_RESET_DELETE:
+        rows = 0
+        for identifier in identifiers:
+            statement = sql.SQL("DELETE FROM {}").format(identifier)
+            if verbose:
+                print("- Deleting all table data in table: {}".format('.'.join(identifier.strings)))
+                print("-- SQL Statement: '{}'\n".format(statement.as_string(cursor)))
+            cursor.execute(statement)
+            rows += cursor.rowcount
+        return rows
+
+    statement = sql.SQL("TRUNCATE TABLE {} RESTART IDENTITY CASCADE").format(sql.SQL(', ').join(identifiers))
+    if verbose:
+        print("-- SQL Statement: '{}'\n".format(statement.as_string(cursor)))
+    cursor.execute(statement)
+    return None
+
+
+def clear_pg_database(mode=PG_RESET_TRUNCATE, replica_role=False):
+    """
+    This will clear a Postgres Database (if exists in the namespace) of all data while retaining the tables and databases
+    By default every table is emptied by a single TRUNCATE ... RESTART IDENTITY CASCADE in one transaction
+    :param mode: PG_RESET_TRUNCATE, or PG_RESET_DELETE to run 'DELETE FROM' on each table instead
+    :param replica_role: set session_replication_role to 'replica' for the transaction, which skips triggers
+                         (including foreign key checks) while clearing, requires superuser
+    :return: True if the database was cleared (or has no tables), False if it couldn't be
+    """
+    print("- Cleaning up Postgres Database...")
+    timings = []
+
+    start = time.time()
+    settings = get_pg_connection_settings()
+    timings.append(('resolve connection', time.time() - start))
+
+    start = time.time()
     try:
-        conn = psycopg2.connect(host=host, port=port, database=database, user=username, password=password)
+        conn = psycopg2.connect(**settings)
     except psycopg2.OperationalError as oe:
-        print("Error: Couldn't connect to Postgres database due to exception:  {}".format(oe.pgerror))
-        return
+        print("Error: Couldn't connect to Postgres database due to exception:  {}".format(oe))
+        return False
+    timings.append(('connect', time.time() - start))
 
-    cursor = conn.cursor()
-    statement = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
-    cursor.execute(statement)
+    try:
+        cursor = conn.cursor()
+
+        start = time.time()
+        tables = [(schema, table) for schema, table, _ in list_pg_tables(cursor, schemas=['public'])]
+        timings.append(('list tables', time.time() - start))
 
-    print("\nDeleting all data from all tables in the database")
+        if not tables:
+            print("No tables found in the database, nothing to clear")
+            return True
 
-    for table in cursor.fetchall():
+        start = time.time()
+        if mode == PG_RESET_DELETE:
+            print("\nDeleting all data from all tables in the database")
+        else:
+            print("\nTruncating all {} tables in the database".format(len(tables)))
+        clear_pg_tables(cursor, tables, mode=mode, replica_role=replica_role, verbose=True)
+        timings.append((mode, time.time() - start))
+
+        start = time.time()
+        conn.commit()
+        timings.append(('commit', time.time() - start))
+    except psycopg2.Error as e:
+        conn.rollback()
+        print("Could not clear table data due to exception:  {}".format(e))
+        return False
+    finally:
+        conn.close()
+
+    for phase, elapsed in timings:
+        print("- {:<20}{:>10.3f}s".format(phase, elapsed))
+    print("Postgres operations completed successfully")
+    return True
+
+
+def reset_pg_database(pools, database, mode=PG_RESET_TRUNCATE, replica_role=False):
+    """
+    Clears every table in every schema of one database in a single transaction
+    :param pools: a PgConnectionPools
+    :param database: the database to reset
+    :param mode: PG_RESET_TRUNCATE or PG_RESET_DELETE
+    :param replica_role: set session_replication_role to 'replica' while clearing
+    :return: a dictionary with the database, schemas, tables, rows removed, elapsed seconds and any error
+    """
+    start = time.time()
+    result = {'database': database, 'schemas': 0, 'tables': 0, 'rows': 0, 'estimated': False, 'error': None}
+    try:
+        with pools.connection(database) as conn:
+            cursor = conn.cursor()
+            tables = list_pg_tables(cursor)
+            result['schemas'] = len(set(schema for schema, _, _ in tables))
+            result['tables'] = len(tables)
+
+            rows = clear_pg_tables(cursor, [(schema, table) for schema, table, _ in tables], mode=mode,
+                                   replica_role=replica_role)
+            if rows is None:
+                # TRUNCATE doesn't report a row count, so fall back to the planner's estimate (exactly 0 when
+                # there are no tables)
+                rows = sum(estimate for _, _, estimate in tables)
+                result['estimated'] = bool(tables)
+            result['rows'] = rows
+            conn.commit()
+    except psycopg2.Error as e:
+        result['error'] = str(e).strip()
+    result['elapsed'] = time.time() - start
+    return result
+
+
+def reset_pg_databases(databases=None, mode=PG_RESET_TRUNCATE, replica_role=False, max_workers=None):
+    """
+    Clears every table in every schema of several databases concurrently over a shared set of connection pools
+    :param databases: the databases to reset, defaults to every non-template database on the server
+    :param mode: PG_RESET_TRUNCATE or PG_RESET_DELETE
+    :param replica_role: set session_replication_role to 'replica' while clearing
+    :param max_workers: how many databases to reset at once, defaults to PG_RESET_WORKERS
+    :return: a list of per-database results as returned by reset_pg_database()
+    """
+    pools = PgConnectionPools()
+    try:
         try:
-            statement = "DELETE FROM {}".format(table[0])
-            print("- Deleting all table data in table: {}".format(table[0]))
-            print("-- SQL Statement: '{}'\n".format(statement))
-            cursor.execute(statement)
+            if databases is None:
+                databases = [db for db in list_pg_databases(pools) if db not in PG_SKIP_DATABASES]
+        except psycopg2.Error as e:
+            print("Error: Couldn't list Postgres databases due to exception:  {}".format(e))
+            return []
+
+        print("Resetting {} Postgres database(s): {}".format(len(databases), ', '.join(databases)))
+        with ThreadPoolExecutor(max_workers=max_workers or PG_RESET_WORKERS) as executor:
+            futures = [executor.submit(reset_pg_database, pools, database, mode, replica_role)
+                       for database in databases]
+            results = [future.result() for future in futures]
+    finally:
+        pools.close()
+
+    print_pg_reset_report(results)
+    return results
+
+
+def _remove_partial_file(path):
+    """
+    Removes a partially written file, ignoring a file that was never created
+    :param path: the file to remove
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def snapshot_pg_database(path, database=None, schemas=None, compresslevel=None):
+    """
+    Saves the contents of every table in a database to a gzip-compressed snapshot file using binary
+    COPY ... TO STDOUT. Table data is streamed straight into the file, so no table is ever held in memory.
+    All tables are read in one REPEATABLE READ transaction so the snapshot is consistent. The snapshot is
+    written to '<path>.part' and only moved to path once it is complete, so a failed snapshot never leaves
+    a truncated file behind
+    :param path: the snapshot file to write
+    :param database: the database to snapshot, defaults to the one in the connection settings
+    :param schemas: only snapshot tables in these schemas, defaults to every non-system schema
+    :param compresslevel: the gzip compression level (1-9), defaults to PG_SNAPSHOT_COMPRESSLEVEL
+    :return: True if the snapshot was written, otherwise False
+    """
+    if compresslevel is None:
+        compresslevel = PG_SNAPSHOT_COMPRESSLEVEL
+    part_path = path + '.part'
+    settings = get_pg_connection_settings()
+    if database:
+        settings['database'] = database
+
+    try:
+        conn = psycopg2.connect(**settings)
+    except psycopg2.OperationalError as oe:
+        print("Error: Couldn't connect to Postgres database due to exception:  {}".format(oe))
+        return False
+
+    try:
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cursor = conn.cursor()
+
+        tables = order_pg_tables_by_dependency(cursor, [(schema, table) for schema, table, _ in
+                                                        list_pg_tables(cursor, schemas)])
+        sequences = list_pg_sequences(cursor, schemas)
+
+        print("Saving snapshot of {} tables in database '{}' to: {}".format(len(tables), settings['database'], path))
+        with gzip.open(part_path, 'wb', compresslevel=compresslevel) as f:
+            f.write(PG_SNAPSHOT_MAGIC)
+            writer = _FrameWriter(f)
+            writer.write(json.dumps({
+                'database': settings['database'],
+                'tables': tables,
+                'sequences': sequences
+            }).encode('utf-8'))
+            writer.end()
+
+            for schema, table in tables:
+                start = time.time()
+                statement = sql.SQL("COPY {} TO STDOUT (FORMAT binary)").format(sql.Identifier(schema, table))
+                cursor.copy_expert(statement.as_string(conn), writer)
+                writer.end()
+                print("- {}.{}  ({:.3f}s)".format(schema, table, time.time() - start))
+
+        conn.commit()
+        os.replace(part_path, path)
+    except psycopg2.Error as e:
+        _remove_partial_file(part_path)
+        print("Could not snapshot the database due to exception:  {}".format(e))
+        return False
+    except OSError as e:
+        # an unwritable or missing directory, or a full disk
+        _remove_partial_file(part_path)
+        print("Could not write the snapshot '{}' due to exception:  {!r}".format(path, e))
+        return False
+    except BaseException:
+        _remove_partial_file(part_path)
+        raise
+    finally:
+        conn.close()
+
+    print("Snapshot saved successfully")
+    return True
+
+
+def restore_pg_database(path, database=None, replica_role=False):
+    """
+    Restores a snapshot written by snapshot_pg_database(). The snapshot's tables are truncated and reloaded
+    with binary COPY ... FROM STDIN in a single transaction with constraints deferred, and sequences are set
+    back to their saved values. The tables are emptied with TRUNCATE ... CASCADE, so the restore is refused
+    if any table that isn't in the snapshot references one of them (e.g. a snapshot taken with schemas=...)
+    :param path: the snapshot file to read
+    :param database: the database to restore into, defaults to the one in the connection settings
+    :param replica_role: set session_replication_role to 'replica' while restoring, which skips triggers
+                         (including foreign key checks), requires superuser
+    :return: True if the snapshot was restored, otherwise False
+    """
+    settings = get_pg_connection_settings()
+    if database:
+        settings['database'] = database
+
+    try:
+        conn = psycopg2.connect(**settings)
+    except psycopg2.OperationalError as oe:
+        print("Error: Couldn't connect to Postgres database due to exception:  {}".format(oe))
+        return False
+
+    try:
+        cursor = conn.cursor()
+        with gzip.open(path, 'rb') as f:
+            if f.read(len(PG_SNAPSHOT_MAGIC)) != PG_SNAPSHOT_MAGIC:
+                print("Error: '{}' is not a Postgres snapshot file".format(path))
+                return False
+
+            manifest = json.loads(_FrameReader(f).read().decode('utf-8'))
+            tables = [tuple(t) for t in manifest['tables']]
+            print("Restoring snapshot of {} tables into database '{}' from: {}".format(
+                len(tables), settings['database'], path))
+
+            cascade_tables = find_pg_cascade_tables(cursor, tables)
+            if cascade_tables:
+                print("Error: Restoring would also empty {} tables that are not in the snapshot "
+                      "(TRUNCATE ... CASCADE):  {}".format(len(cascade_tables),
+                                                          ', '.join('.'.join(t) for t in cascade_tables)))
+                return False
+
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+            clear_pg_tables(cursor, tables, mode=PG_RESET_TRUNCATE, replica_role=replica_role)
+
+            for schema, table in tables:
+                start = time.time()
+                statement = sql.SQL("COPY {} FROM STDIN (FORMAT binary)").format(sql.Identifier(schema, table))
+                cursor.copy_expert(statement.as_string(conn), _FrameReader(f))
+                print("- {}.{}  ({:.3f}s)".format(schema, table, time.time() - start))
+
+        for schema, sequence, last_value in manifest['sequences']:
+            if last_value is not None:
+                cursor.execute("SELECT setval(%s, %s)", (sql.Identifier(schema, sequence).as_string(conn), last_value))
+
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print("Could not restore the snapshot due to exception:  {}".format(e))
+        return False
+    except (EOFError, struct.error, zlib.error, OSError, ValueError, KeyError, TypeError) as e:
+        # a missing, truncated or corrupt file (gzip.BadGzipFile is an OSError, bad JSON a ValueError)
+        conn.rollback()
+        print("Could not read the snapshot '{}' due to exception:  {!r}".format(path, e))
+        return False
+    finally:
+        conn.close()
+
+    print("Snapshot restored successfully")
+    return True
+
+
+def list_pg_sequences(cursor, schemas=None):
+    """
+    Lists the sequences in a database along with their current values
+    :param cursor: a cursor for the database
+    :param schemas: only list sequences in these schemas, defaults to every non-system schema
+    :return: a list of (schema, sequence, last value) tuples, the last value is None if the sequence is unused
+    """
+    statement = "SELECT schemaname, sequencename, last_value FROM pg_sequences " \
+                "WHERE schemaname <> 'information_schema' AND schemaname !~ '^pg_'"
+    params = None
+    if schemas:
+        statement += " AND schemaname IN %s"
+        params = (tuple(schemas),)
+    cursor.execute(statement + " ORDER BY schemaname, sequencename", params)
+    return [list(row) for row in cursor.fetchall()]
+
+
+def order_pg_tables_by_dependency(cursor, tables):
+    """
+    Orders tables so that tables referenced by foreign keys come before the tables that reference them,
+    which lets non-deferrable foreign keys pass when the tables are loaded in order
+    :param cursor: a cursor for the database
+    :param tables: a list of (schema, table) tuples
+    :return: the tables as a list of [schema, table] lists, parents first
+    """
+    cursor.execute("SELECT cn.nspname, c.relname, pn.nspname, p.relname FROM pg_constraint con "
+                   "JOIN pg_class c ON c.oid = con.conrelid JOIN pg_namespace cn ON cn.oid = c.relnamespace "
+                   "JOIN pg_class p ON p.oid = con.confrelid JOIN pg_namespace pn ON pn.oid = p.relnamespace "
+                   "WHERE con.contype = 'f'")
+    parents = dict((tuple(t), set()) for t in tables)
+    for child_schema, child, parent_schema, parent in cursor.fetchall():
+        key = (child_schema, child)
+        if key in parents and (parent_schema, parent) in parents and key != (parent_schema, parent):
+            parents[key].add((parent_schema, parent))
+
+    ordered = []
+    visited = set()
+
+    def visit(table, path):
+        if table in visited or table in path:
+            # Already placed, or part of a foreign key cycle that only deferred constraints can satisfy
+            return
+        path.add(table)
+        for parent in sorted(parents[table]):
+            visit(parent, path)
+        path.discard(table)
+        visited.add(table)
+        ordered.append(list(table))
+
+    for table in tables:
+        visit(tuple(table), set())
+    return ordered
+
+
+def find_pg_cascade_tables(cursor, tables):
+    """
+    Finds the tables outside of the given tables that a TRUNCATE ... CASCADE of them would also empty,
+    i.e. every table that (directly or through other tables) references one of them with a foreign key
+    :param cursor: a cursor for the database
+    :param tables: a list of (schema, table) tuples
+    :return: the other tables as a sorted list of (schema, table) tuples
+    """
+    cursor.execute("SELECT cn.nspname, c.relname, pn.nspname, p.relname FROM pg_constraint con "
+                   "JOIN pg_class c ON c.oid = con.conrelid JOIN pg_namespace cn ON cn.oid = c.relnamespace "
+                   "JOIN pg_class p ON p.oid = con.confrelid JOIN pg_namespace pn ON pn.oid = p.relnamespace "
+                   "WHERE con.contype = 'f'")
+    children = {}
+    for child_schema, child, parent_schema, parent in cursor.fetchall():
+        children.setdefault((parent_schema, parent), set()).add((child_schema, child))
+
+    reached = set(tuple(t) for t in tables)
+    pending = list(reached)
+    while pending:
+        for child in children.get(pending.pop(), ()):
+            if child not in reached:
+                reached.add(child)
+                pending.append(child)
+    return sorted(reached - set(tuple(t) for t in tables))
+
+
+class _FrameWriter(object):
+    """
+    A file-like sink for COPY ... TO STDOUT that writes the data to a snapshot file as length-prefixed frames,
+    coalescing the many small writes COPY makes into larger frames
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= PG_SNAPSHOT_FRAME_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._f.write(struct.pack('>I', len(self._buffer)))
+            self._f.write(self._buffer)
+            self._buffer = bytearray()
+
+    def end(self):
+        """
+        Writes any buffered data followed by the empty frame that marks the end of a section
+        """
+        self._flush()
+        self._f.write(struct.pack('>I', 0))
+
+
+class _FrameReader(object):
+    """
+    A file-like source for COPY ... FROM STDIN that reads one section of a snapshot file frame by frame,
+    stopping at the empty frame that marks the end of the section
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._frame = b''
+        self._position = 0
+        self._done = False
+
+    def _read_frame(self):
+        length = struct.unpack('>I', _read_exactly(self._f, 4))[0]
+        if length == 0:
+            self._done = True
+            return b''
+        return _read_exactly(self._f, length)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            chunk = self.read(PG_SNAPSHOT_FRAME_SIZE)
+            while chunk:
+                chunks.append(chunk)
+                chunk = self.read(PG_SNAPSHOT_FRAME_SIZE)
+            return b''.join(chunks)
+
+        while self._position >= len(self._frame):
+            if self._done:
+                return b''
+            self._frame, self._position = self._read_frame(), 0
+
+        data = self._frame[self._position:self._position + size]
+        self._position += len(data)
+        return data
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError("Snapshot file is truncated")
+    return data
+
+
+def print_pg_reset_report(results):
+    """
+    Prints the tables, rows removed and time taken for each database reset
+    :param results: a list of results as returned by reset_pg_database()
+    """
+    print("\n{:<32}{:>8}{:>8}{:>14}{:>10}  {}".format('DATABASE', 'SCHEMAS', 'TABLES', 'ROWS', 'SECONDS', 'RESULT'))
+    for r in results:
+        rows = '~{}'.format(r['rows']) if r['estimated'] else str(r['rows'])
+        print("{:<32}{:>8}{:>8}{:>14}{:>10.3f}  {}".format(r['database'], r['schemas'], r['tables'], rows,
+                                                          r['elapsed'], r['error'] or 'ok'))
+
+
+"""
+--------------------------
+     HELM FUNCTIONS
+--------------------------
+"""
+
+
+def find_helm_release_namespaces(release):
+    """
+    Finds the namespaces a Helm release is installed in. Helm 3 keeps each release's history as Secrets labelled
+    owner=helm and name=<release> in the release's namespace
+    :param release: the name of the Helm release
+    :return: a sorted list of namespaces, empty if the release isn't installed. When HELM_UNINSTALL_COMMAND
+             doesn't take a namespace (i.e. Helm 2) nothing is looked up and [None] is returned
+    """
+    if not any('{namespace}' in arg for arg in HELM_UNINSTALL_COMMAND):
+        return [None]
+    v1 = get_client_context().core_v1()
+    secrets = iterate_list(v1.list_secret_for_all_namespaces, raw=True,
+                           label_selector='owner=helm,name={}'.format(release))
+    return sorted(set(secret.metadata.namespace for secret in secrets))
+
+
+def helm_uninstall_command(release, namespace=None):
+    """
+    :return: HELM_UNINSTALL_COMMAND for a release installed in a namespace
+    """
+    return [arg.format(release=release, namespace=namespace) for arg in HELM_UNINSTALL_COMMAND]
+
+
+def helm_uninstall(release, namespace=None, timeout=None):
+    """
+    Uninstalls a Helm release using HELM_UNINSTALL_COMMAND, capturing its output. The command targets the same
+    kubeconfig and context as the current client context
+    :param release: the name of the Helm release
+    :param namespace: the namespace the release is installed in (see find_helm_release_namespaces())
+    :param timeout: seconds to let helm run before it's killed, defaults to HELM_TIMEOUT_SECONDS
+    :return: a tuple of (return code, output), the return code is None if helm timed out or couldn't be run
+    """
+    if timeout is None:
+        timeout = HELM_TIMEOUT_SECONDS
+    command = helm_uninstall_command(release, namespace)
+    ctx = get_client_context()
+    if ctx.config_file:
+        command += ['--kubeconfig', ctx.config_file]
+    if ctx.context:
+        command += ['--kube-context', ctx.context]
+
+    try:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as oe:
+        return None, "Could not run '{}': {}".format(command[0], oe)
+
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        output, _ = proc.communicate()
+        output += "\nKilled after {} seconds".format(timeout).encode('utf-8')
+        return None, output.decode('utf-8', 'replace')
+    return proc.returncode, output.decode('utf-8', 'replace')
+
+
+"""
+--------------------------    
+     OUTPUT FUNCTIONS 
+--------------------------    
+"""
+
+def parse_fields(fields):
+    """
+    Splits a comma separated --fields value into a list of field paths
+    :param fields: a string such as 'metadata.name,status.pod_ip', or None
+    :return: a list of field paths, or None if no fields were given
+    """
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
+
+def get_field(obj, path):
+    """
+    Extracts a single attribute from a Kubernetes object using a dotted path, without converting the whole
+    object (i.e. 'metadata.name' or 'status.pod_ip')
+    :param obj: a Kubernetes API object, or a decoded JSON object whose camelCase keys are matched by the
+                model attribute names (i.e. 'creation_timestamp' finds 'creationTimestamp')
+    :param path: the dotted attribute path
+    :return: the attribute's value, or None if any part of the path is missing
+    """
+    value = obj
+    for attr in path.split('.'):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value[attr] if attr in value else _json_key_value(value, attr)
+        else:
+            value = getattr(value, attr, None)
+    return value
+
+
+def _json_key_value(obj, attr):
+    """
+    Gets the value of a JSON key by its model attribute name (i.e. 'pod_ip' finds 'podIP')
+    """
+    wanted = attr.replace('_', '').lower()
+    for key, value in obj.items():
+        if key.lower() == wanted:
+            return value
+    return None
+
+
+def validate_fields(fields, model, extra=()):
+    """
+    Checks field paths against the attributes of a Kubernetes model, so a mistyped field is reported rather
+    than printed as null for every object. Paths may go into dictionaries (i.e. 'metadata.labels.app') but
+    not into lists
+    :param fields: the dotted field paths
+    :param model: the name of the kubernetes.client model the paths start from (i.e. 'V1Pod')
+    :param extra: fields that don't come from the object (i.e. 'resource'), 'cluster' is always allowed
+    :raises ValueError: if any of the fields don't exist
+    """
+    unknown = [f for f in fields if f != 'cluster' and f not in extra and not _model_has_field(model, f)]
+    if unknown:
+        raise ValueError("Unknown field{} for {}: {}".format('s' if len(unknown) > 1 else '', model,
+                                                              ', '.join(unknown)))
+
+
+def validate_ns_object_fields(fields):
+    """
+    Checks --nsobjects field paths. The objects can be of any resource, so only the metadata fields that every
+    object has are checked
+    :raises ValueError: if any of the metadata fields aren't ObjectMeta attributes
+    """
+    unknown = [f for f in fields if f.startswith('metadata.') and not _model_has_field('V1ObjectMeta', f[9:])]
+    if unknown:
+        raise ValueError("Unknown metadata field{}: {}".format('s' if len(unknown) > 1 else '', ', '.join(unknown)))
+
+
+def _model_has_field(model, path):
+    model_class = getattr(client, model)
+    for attr in path.split('.'):
+        openapi_types = getattr(model_class, 'openapi_types', None)
+        if openapi_types is None or attr not in openapi_types:
+            return False
+        # i.e. 'dict(str, str)' or 'Dict[str, str]' depending on the client version
+        attr_type = openapi_types[attr]
+        if attr_type.lower() == 'object' or attr_type.lower().startswith('dict'):
+            return True
+        # None for scalars and lists, so any further part of the path is unknown
+        model_class = getattr(client, attr_type, None)
+    return True
+
+
+class RecordWriter(object):
+    """
+    Writes one record per object as soon as it is produced, extracting only the selected fields.
+    Records are written as tab separated text (table), JSON Lines (jsonl) or CSV (csv), and each record is
+    flushed immediately so downstream tools can consume the output incrementally
+    """
+
+    def __init__(self, fields, output=OUTPUT_TABLE):
+        """
+        :param fields: the dotted attribute paths to write for each object (see get_field())
+        :param output: OUTPUT_TABLE, OUTPUT_JSONL or OUTPUT_CSV
+        """
+        self.fields = list(fields)
+        self.output = output
+        self._csv_header_written = False
+
+        # When running against several clusters the cluster becomes a field of each record, rather than a
+        # line prefix that would break the JSON/CSV
+        self.cluster = get_client_context().name if output != OUTPUT_TABLE else None
+        if self.cluster:
+            self.fields.insert(0, 'cluster')
+
+    def write(self, obj, **extra):
+        """
+        Writes a record for an object
+        :param obj: the Kubernetes API object
+        :param extra: values for fields that don't come from the object (i.e. resource='pods')
+        """
+        if self.cluster:
+            extra['cluster'] = self.cluster
+        values = [extra[f] if f in extra else _to_output_value(get_field(obj, f)) for f in self.fields]
+
+        if self.output == OUTPUT_JSONL:
+            text = json.dumps(OrderedDict(zip(self.fields, values)), default=str) + '\n'
+        elif self.output == OUTPUT_CSV:
+            text = self._csv_header() + self._csv_row(values)
+        else:
+            text = '\t'.join('%s' % v for v in values) + '\n'
+
+        stream = sys.stdout
+        if self.output != OUTPUT_TABLE and isinstance(stream, _ClusterPrefixedStdout):
+            stream.write_raw(text)
+        else:
+            stream.write(text)
+        stream.flush()
+
+    def _csv_header(self):
+        # when running against several clusters, every cluster's writer shares the one header
+        stream = sys.stdout
+        if isinstance(stream, _ClusterPrefixedStdout):
+            if not stream.claim_header(tuple(self.fields)):
+                return ''
+        elif self._csv_header_written:
+            return ''
+        self._csv_header_written = True
+        return self._csv_row(self.fields)
+
+    @staticmethod
+    def _csv_row(values):
+        row = StringIO()
+        csv.writer(row, lineterminator='\n').writerow(
+            [json.dumps(v, default=str) if isinstance(v, (dict, list)) else v for v in values])
+        return row.getvalue()
+
+
+def _to_output_value(value):
+    """
+    Converts a Kubernetes model object (i.e. a V1ContainerStatus) into plain data, other values are unchanged
+    """
+    if isinstance(value, list):
+        return [_to_output_value(v) for v in value]
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    return value
+
+
+class TimelineStage(object):
+    __slots__ = ('name', 'started', 'finished', 'result')
+
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+        self.finished = None
+        self.result = 'ok'
+
+
+class Timeline(object):
+    """
+    Records when each stage of a long-running command started and finished, and how it ended. Stages may run
+    concurrently, so the timeline shows which of them overlapped and where the time went
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage, the caller may set the yielded TimelineStage's result (defaults to 'ok'). A stage that
+        raises is recorded as failed
+        :param name: the stage's name
+        """
+        stage = TimelineStage(name, time.time())
+        with self._lock:
+            self.stages.append(stage)
+        try:
+            yield stage
         except Exception as e:
-            print("Could not delete table data in table: '{}' due to exception:  {}".format(table, e))
+            stage.result = 'failed: {}'.format(e)
+            raise
+        finally:
+            stage.finished = time.time()
+
+
+def print_timeline(timeline, width=40):
+    """
+    Prints each stage's start, end and duration relative to the start of the timeline, with a bar showing
+    when it ran
+    :param timeline: a Timeline
+    :param width: the width of the bars in characters
+    """
+    now = time.time()
+    total = max(now - timeline.started, 0.001)
+    print("\n{:<24}{:>9}{:>9}{:>9}  {:<{width}}  {}".format('STAGE', 'START', 'END', 'SECONDS', '', 'RESULT',
+                                                          width=width + 2))
+    for stage in sorted(timeline.stages, key=lambda st: st.started):
+        start = stage.started - timeline.started
+        end = (stage.finished or now) - timeline.started
+        first = int(start / total * width)
+        last = max(first + 1, int(math.ceil(end / total * width)))
+        bar = ' ' * first + '#' * (last - first) + ' ' * (width - last)
+        print("{:<24}{:>9.1f}{:>9.1f}{:>9.1f}  |{}|  {}".format(stage.name, start, end, end - start, bar,
+                                                             stage.result))
+    print("\nTotal: {:.1f} seconds".format(total))
+
+
+"""
+--------------------------    
+ MULTI-CLUSTER FUNCTIONS 
+--------------------------    
+"""
+
+
+def get_kube_config_context_names(config_file=None):
+    """
+    Gets the names of every context in the kubeconfig
+    :param config_file: the kubeconfig file to read, defaults to ~/.kube/config or $KUBECONFIG
+    :return: a list of context names
+    """
+    contexts, _ = config.list_kube_config_contexts(config_file=config_file)
+    return [c['name'] for c in contexts]
+
+
+def run_across_contexts(action, contexts, max_workers=None):
+    """
+    Runs an action against several clusters in parallel. Each cluster gets its own K8sClientContext (and so its
+    own ApiClient and object cache), and every line of output is prefixed with the name of its cluster
+    :param action: a function taking no arguments (i.e. get_all_pods)
+    :param contexts: the kubeconfig context names to run the action against
+    :param max_workers: how many clusters to run the action against at once, defaults to CLUSTER_WORKERS
+    :return: a dictionary of {context name: error message, or None if the action succeeded}
+    """
+    stdout = sys.stdout
+    prefixed_stdout = _ClusterPrefixedStdout(stdout)
+    sys.stdout = prefixed_stdout
+
+    def run(context):
+        ctx = K8sClientContext(context=context)
+        try:
+            with use_client_context(ctx):
+                try:
+                    action()
+                except Exception as e:
+                    print("Error: {}".format(e))
+                    return '{}: {}'.format(type(e).__name__, e)
+                finally:
+                    prefixed_stdout.end_line()
+        finally:
+            ctx.close()
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or CLUSTER_WORKERS) as executor:
+            results = dict(zip(contexts, executor.map(run, contexts)))
+    finally:
+        sys.stdout = stdout
+
+    log_title("Cluster Results")
+    for context in contexts:
+        print("{:<40}{}".format(context, results[context] or 'ok'))
+    return results
+
+
+class _ClusterPrefixedStdout(object):
+    """
+    Stands in for sys.stdout while an action runs against several clusters, writing whole lines only and
+    prefixing each one with the name of the cluster the writing thread is working on
+    """
+
+    def __init__(self, stream):
+        self.raw = stream
+        self._lock = threading.Lock()
+        self._partial = {}
+        self._headers = set()
+
+    def write(self, text):
+        ctx = getattr(_thread_local, 'client_context', None)
+        if ctx is None or not ctx.name:
+            with self._lock:
+                self.raw.write(text)
             return
 
-    # conn = psycopg2.connect(host=host, port=port, user=username, password=password)
-    # conn.set_isolation_level(0)
-    # cursor = conn.cursor()
-    #
-    # try:
-    #     print("Deleting '{}' Database from Postgres...".format(database))
-    #     cursor.execute("DROP DATABASE {}".format(database)
-    # except Exception as e:
-    #     print("Could not drop '{}' database due to exception:  {}".format(database, e))
-    #     return
+        key = threading.current_thread().ident
+        text = self._partial.pop(key, '') + text
+        end = text.rfind('\n') + 1
+        if end < len(text):
+            self._partial[key] = text[end:]
+
+        if end:
+            prefix = '[{}] '.format(ctx.name)
+            lines = ''.join(prefix + line for line in text[:end].splitlines(True))
+            with self._lock:
+                self.raw.write(lines)
+
+    def write_raw(self, text):
+        """
+        Writes text without a cluster prefix, for output that carries the cluster name itself
+        """
+        with self._lock:
+            self.raw.write(text)
+
+    def claim_header(self, header):
+        """
+        Records that a header is being written, so output from every cluster shares a single header
+        :param header: the header's fields
+        :return: True the first time a header is claimed, False once it's been written
+        """
+        with self._lock:
+            if header in self._headers:
+                return False
+            self._headers.add(header)
+            return True
+
+    def end_line(self):
+        """
+        Writes out anything the current thread has written since its last newline
+        """
+        if threading.current_thread().ident in self._partial:
+            self.write('\n')
+
+    def flush(self):
+        self.raw.flush()
+
+    def __getattr__(self, attr):
+        return getattr(self.raw, attr)
 
-    print("Postgres operations completed successfully")
+
+"""
+--------------------------
+     PLAN FUNCTIONS
+--------------------------
+"""
+
+PLAN_CLEANUP = "cleanup"
+PLAN_NUKE = "nuke"
+PLAN_FILE_VERSION = 1
+
+
+class TeardownPlan(object):
+    """
+    Everything --cleanup or --nuke will delete, gathered up front with a few bulk list calls. A plan can be
+    saved to a file, reviewed, and then executed without listing the cluster again
+    """
+
+    def __init__(self, command, deletion, helm_chart=None, namespaces=None, postgres_namespace=None,
+                 object_counts=None, latency=None, context=None, created=None, helm_namespaces=None):
+        """
+        :param command: PLAN_CLEANUP or PLAN_NUKE
+        :param deletion: the DeletionPlan of PVCs and PVs to delete
+        :param helm_chart: the Helm chart being nuked
+        :param namespaces: the namespaces that will be deleted (nuke only)
+        :param postgres_namespace: the namespace of the Postgres service that will be cleared, if any (nuke only)
+        :param object_counts: {namespace: {kind: count}} of objects that will go with the namespaces (nuke only)
+        :param latency: the median seconds per API request measured while planning
+        :param context: the kubeconfig context the plan was made against
+        :param created: when the plan was made, defaults to now
+        :param helm_namespaces: the namespaces the Helm release is installed in (nuke only), None if they weren't
+                                looked up
+        """
+        self.command = command
+        self.deletion = deletion
+        self.helm_chart = helm_chart
+        self.namespaces = namespaces or []
+        self.postgres_namespace = postgres_namespace
+        self.object_counts = object_counts or {}
+        self.latency = latency
+        self.context = context
+        self.created = created or time.time()
+        self.helm_namespaces = helm_namespaces
+
+    def to_dict(self):
+        return {
+            'version': PLAN_FILE_VERSION,
+            'command': self.command,
+            'helm_chart': self.helm_chart,
+            'context': self.context,
+            'created': self.created,
+            'latency': self.latency,
+            'namespaces': self.namespaces,
+            'helm_namespaces': self.helm_namespaces,
+            'postgres_namespace': self.postgres_namespace,
+            'object_counts': self.object_counts,
+            'deletion': self.deletion.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PLAN_FILE_VERSION:
+            raise ValueError("unsupported plan file version {}".format(data.get('version')))
+        return cls(data['command'], DeletionPlan.from_dict(data.get('deletion') or {}),
+                   helm_chart=data.get('helm_chart'), namespaces=data.get('namespaces'),
+                   postgres_namespace=data.get('postgres_namespace'), object_counts=data.get('object_counts'),
+                   latency=data.get('latency'), context=data.get('context'), created=data.get('created'),
+                   helm_namespaces=data.get('helm_namespaces'))
+
+    def save(self, path):
+        """
+        Writes the plan to a JSON file
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a plan written by save()
+        :return: a TeardownPlan
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def measure_api_latency(samples=None):
+    """
+    Times a small API request several times
+    :param samples: how many requests to time, defaults to PLAN_LATENCY_SAMPLES
+    :return: the median seconds per request
+    """
+    v1 = get_client_context().core_v1()
+    timings = sorted(_timed_call(v1.list_namespace, limit=1)[1] for _ in range(samples or PLAN_LATENCY_SAMPLES))
+    return timings[len(timings) // 2]
+
+
+def plan_cleanup():
+    """
+    Plans --cleanup: the PVCs matching PVC_LIST or in NAMESPACES, and the PVs bound to them
+    :return: a TeardownPlan
+    """
+    deletion = plan_persistent_data_deletion(PVC_LIST, NAMESPACES)
+    return TeardownPlan(PLAN_CLEANUP, deletion, latency=measure_api_latency(),
+                        context=_current_context_name(get_client_context()))
+
+
+def plan_nuke(helm_chart):
+    """
+    Plans --nuke: whether Postgres will be cleared, the chart's namespaces and how many pods, services and PVCs
+    are in them, and the PVCs and PVs to delete. Pods, services, PVCs and PVs are each listed once for the
+    whole cluster
+    :param helm_chart: the name of the Helm chart to nuke
+    :return: a TeardownPlan
+    """
+    ctx = get_client_context()
+    chart_namespaces = HELM_CHARTS[helm_chart]
+
+    existing = set(ns.metadata.name for ns in iterate_list(ctx.core_v1().list_namespace, raw=True))
+    namespaces = [ns for ns in chart_namespaces if ns in existing]
+
+    _, s_namespace = get_service_name_namespace('postgres')
+    postgres_namespace = s_namespace if s_namespace in chart_namespaces else None
+
+    object_counts = dict((ns, {}) for ns in namespaces)
+    for kind in ('pod', 'service', 'pvc'):
+        for item in ctx.cache.find(kind):
+            if item.metadata.namespace in object_counts:
+                counts = object_counts[item.metadata.namespace]
+                counts[kind] = counts.get(kind, 0) + 1
+
+    deletion = plan_persistent_data_deletion(PVC_LIST, chart_namespaces)
+    return TeardownPlan(PLAN_NUKE, deletion, helm_chart=helm_chart, namespaces=namespaces,
+                        postgres_namespace=postgres_namespace, object_counts=object_counts,
+                        latency=measure_api_latency(), context=_current_context_name(ctx),
+                        helm_namespaces=find_helm_release_namespaces(helm_chart))
+
+
+def estimate_teardown(plan, parallelism=None):
+    """
+    Estimates how many API requests executing a plan makes and how long they take, using the latency measured
+    while planning. Time spent waiting for objects to finish deleting, clearing Postgres and running Helm is
+    not included since it doesn't depend on the number of requests
+    :param plan: a TeardownPlan
+    :param parallelism: how many PVC/PV delete calls are made at once, defaults to DELETE_PARALLELISM
+    :return: a tuple of (API requests, estimated seconds)
+    """
+    parallelism = parallelism or DELETE_PARALLELISM
+    deletes = len(plan.deletion)
+    # a list and a watch per object type while waiting for the deletes
+    waits = 2 * (bool(plan.deletion.pvcs) + bool(plan.deletion.pvs))
+    calls = deletes + waits
+    rounds = int(math.ceil(deletes / float(parallelism))) + waits
+
+    if plan.command == PLAN_NUKE and plan.namespaces:
+        # the namespace deletes are made at once, then a list and a watch while they terminate
+        calls += len(plan.namespaces) + 2
+        rounds += 3
+
+    return calls, rounds * (plan.latency or 0)
+
+
+def print_teardown_plan(plan, parallelism=None):
+    """
+    Prints what executing a plan will delete, with counts and the API request estimate
+    :param plan: a TeardownPlan
+    :param parallelism: how many PVC/PV delete calls are made at once, defaults to DELETE_PARALLELISM
+    """
+    if plan.command == PLAN_NUKE:
+        log_title("Nuke Plan: '{}'".format(plan.helm_chart))
+        if plan.postgres_namespace:
+            print("Postgres in namespace '{}' will be cleared".format(plan.postgres_namespace))
+        else:
+            print("- No Postgres to clear")
+        for namespace in plan.helm_namespaces or ():
+            print("Helm release '{}' will be uninstalled: {}".format(
+                plan.helm_chart, ' '.join(helm_uninstall_command(plan.helm_chart, namespace))))
+        if not plan.helm_namespaces:
+            print("- Helm release '{}' isn't installed".format(plan.helm_chart))
+
+        print("\n{:<32}{:>8}{:>10}{:>8}".format('NAMESPACE', 'PODS', 'SERVICES', 'PVCS'))
+        for namespace in plan.namespaces:
+            counts = plan.object_counts.get(namespace, {})
+            print("{:<32}{:>8}{:>10}{:>8}".format(namespace, counts.get('pod', 0), counts.get('service', 0),
+                                                  counts.get('pvc', 0)))
+        if not plan.namespaces:
+            print("- No namespaces to delete")
+    else:
+        log_title("Cleanup Plan")
+
+    print()
+    print_deletion_plan(plan.deletion)
+
+    calls, seconds = estimate_teardown(plan, parallelism)
+    totals = "{} PVC(s), {} PV(s)".format(len(plan.deletion.pvcs), len(plan.deletion.pvs))
+    if plan.command == PLAN_NUKE:
+        totals = "{} namespace(s), {}".format(len(plan.namespaces), totals)
+    print("\nTotal: {}".format(totals))
+    print("Estimate: {} API requests, ~{:.1f} seconds of API time (median latency {:.0f} ms, parallelism {})".format(
+        calls, seconds, (plan.latency or 0) * 1000, parallelism or DELETE_PARALLELISM))
+
+
+def _current_context_name(ctx):
+    """
+    :return: the kubeconfig context a client context uses, resolving the current context when none was given
+    """
+    if ctx.context:
+        return ctx.context
+    try:
+        return config.list_kube_config_contexts(config_file=ctx.config_file)[1]['name']
+    except Exception:
+        return None
+
+
+def load_teardown_plan(path, command, helm_chart=None):
+    """
+    Loads a saved plan, checking it was made for the same command, chart and kubeconfig context
+    :param path: the plan file
+    :param command: PLAN_CLEANUP or PLAN_NUKE
+    :param helm_chart: the Helm chart being nuked
+    :return: a TeardownPlan, or None if it can't be read or doesn't match
+    """
+    try:
+        plan = TeardownPlan.load(path)
+    except (IOError, OSError) as e:
+        print("Could not read plan file '{}': {}".format(path, e))
+        return None
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # bad JSON or an unsupported version (ValueError), or JSON that isn't a plan
+        print("Plan file '{}' is not a valid plan file: {!r}".format(path, e))
+        return None
+    context = _current_context_name(get_client_context())
+    if plan.command != command or plan.helm_chart != helm_chart:
+        print("Plan file '{}' is a plan for --{} {}, not --{} {}".format(
+            path, plan.command, plan.helm_chart or '', command, helm_chart or ''))
+        return None
+    if plan.context != context:
+        print("Plan file '{}' was made against kubeconfig context '{}', not '{}'".format(
+            path, plan.context or '(current)', context or '(current)'))
+        return None
+    print("Executing plan from '{}', made {:.0f} minute(s) ago".format(path, (time.time() - plan.created) / 60))
+    return plan
 
 
 """
@@ -607,19 +3331,25 @@ def get_values_for_values_yaml():
     print("- storageclass: {}".format(storageclass))
 
 
-def cleanup_persistent_data():
+def cleanup_persistent_data(parallelism=None, plan=None):
     """
     Deletes all PersistentVolumes and PersistentVolumeClaims as defined in the PVC_LIST variable
-    Checks the cluster for any other PVs or PVCs and prints the result
+    and in the namespaces in the NAMESPACES variable, then checks the cluster for any other PVs or PVCs
+    and prints the result
+    :param parallelism: how many delete calls to make at once, defaults to DELETE_PARALLELISM
+    :param plan: a TeardownPlan from plan_cleanup() to execute instead of planning again
     """
-    for pvc in PVC_LIST:
-        log_title("Cleaning up {} Persistent Data".format(pvc.capitalize()))
-        delete_persistent_data_objects_by_pvc_name(pvc)
+    if plan is not None:
+        plan = plan.deletion
+    else:
+        log_title("Planning Persistent Data Cleanup")
+        plan = plan_persistent_data_deletion(PVC_LIST, NAMESPACES)
+        print_deletion_plan(plan)
 
-    log_title("Checking Namespaces for Remaining PVCs")
-    global NAMESPACES
-    for ns in NAMESPACES:
-        delete_persistent_data_objects_by_namespace(ns)
+    if plan:
+        log_title("Deleting {} Persistent Data Objects".format(len(plan)))
+        results = execute_deletion_plan(plan, parallelism=parallelism)
+        print_deletion_summary(results)
 
     log_title("Checking Cluster for PVs and PVCs")
     check_for_persistent_data_objects()
@@ -627,58 +3357,200 @@ def cleanup_persistent_data():
     log_title("CLEANUP COMPLETED")
 
 
-def debug_pod(pod_shortname):
+def debug_pod(pod_shortname, namespace=None, label_selector=None, tail_lines=None, since_seconds=None,
+              follow=False, all_containers=False, log_file=None):
     """
     Gets the logs and the 'describe' for a pod using any unique part of the pod name (i.e. 'consul')
+    The logs are streamed as they arrive rather than being read into memory first
     :param pod_shortname: any unique portion of a pod name
+    :param namespace: only search this namespace
+    :param label_selector: only consider pods matching this label selector (i.e. 'app=consul')
+    :param tail_lines: only print this many lines from the end of the log
+    :param since_seconds: only print log lines newer than this many seconds
+    :param follow: keep printing new log lines until the user interrupts
+    :param all_containers: print the logs of every container rather than just the application container
+    :param log_file: write the logs to this file instead of printing them
     """
-    pod_info = get_pod_information(pod_shortname)
-    print('Pod Description: \n{}'.format(pod_info['pod']))
-    print('\n\n\nPod Logs: \n{}'.format(pod_info['log']))
+    pod_info = get_pod_information(pod_shortname, namespace=namespace, label_selector=label_selector,
+                                   include_log=False)
+    if not pod_info:
+        return
+    pod = pod_info['pod']
+    print('Pod Description: \n{}'.format(pod))
 
+    sink = open(log_file, 'w') if log_file else sys.stdout
+    try:
+        if log_file:
+            print('\n\n\nWriting Pod Logs to: {}'.format(log_file))
+        else:
+            print('\n\n\nPod Logs: ')
+        if all_containers:
+            stream_all_container_logs(pod, sink=sink, tail_lines=tail_lines, since_seconds=since_seconds,
+                                      follow=follow)
+        else:
+            stream_pod_logs(pod.metadata.name, pod.metadata.namespace, container=get_main_container_name(pod),
+                            sink=sink, tail_lines=tail_lines, since_seconds=since_seconds, follow=follow)
+    finally:
+        if log_file:
+            sink.close()
 
-def print_all_objects_belonging_to_namespace(namespace):
+
+def print_all_objects_belonging_to_namespace(namespace, max_workers=None, output=OUTPUT_TABLE, fields=None):
     """
-    Prints the names and types of all K8s objects belonging to a namespace
+    Prints the names and types of all K8s objects belonging to a namespace, followed by how long each
+    resource type took to list. When an output format or fields are given, one record per object is
+    printed as soon as its resource type has been listed instead
     :param namespace: namespace to search
+    :param max_workers: the number of list calls to run at once, defaults to LIST_WORKERS
+    :param output: OUTPUT_TABLE, OUTPUT_JSONL or OUTPUT_CSV
+    :param fields: the object attributes to print, defaults to DEFAULT_NS_OBJECT_FIELDS
+                   ('resource' is the resource the object was listed as, i.e. 'deployments.apps'). Fields
+                   outside of metadata (i.e. 'spec.replicas') list the full objects and are null for
+                   resources that don't have them
+    :raises ValueError: if any of the metadata fields aren't ObjectMeta attributes
     """
-    k8s_obj_list = get_all_items_in_namespace(namespace)
+    validate_ns_object_fields(fields or ())
+    if output != OUTPUT_TABLE or fields:
+        writer = RecordWriter(fields or DEFAULT_NS_OBJECT_FIELDS, output)
+
+        def write_records(resource, items):
+            for item in items:
+                writer.write(item, resource=resource)
+
+        get_all_items_in_namespace(namespace, max_workers=max_workers, on_result=write_records,
+                                   fields=writer.fields)
+        return
+
+    timings = {}
+    errors = {}
+    k8s_obj_list = get_all_items_in_namespace(namespace, max_workers=max_workers, timings=timings, errors=errors)
+    if k8s_obj_list is None:
+        return
 
-    for o in k8s_obj_list:
-        for k in o:
-            obj = o[k]
-            if len(obj.items) > 0:
-                print("\n--- {} in {} ---".format(k.capitalize(), namespace))
-                for item in obj.items:
-                    print("- {}".format(item.metadata.name))
+    for resource, items in k8s_obj_list.items():
+        if len(items) > 0:
+            print("\n--- {} in {} ---".format(resource, namespace))
+            for item in items:
+                print("- {}".format(item.metadata.name))
 
+    print_list_timings(timings)
+    if errors:
+        print("\n--- Skipped ---")
+        for resource in sorted(errors):
+            print("- {} ({})".format(resource, errors[resource]))
 
-def nuke(helm_chart):
+
+def print_list_timings(timings):
+    """
+    Prints per-resource list latency and item counts, slowest first
+    :param timings: dictionary of {resource: (seconds, item count)}
+    """
+    print("\n--- List timings ---")
+    print("{:<28}{:>10}{:>10}".format('RESOURCE', 'SECONDS', 'ITEMS'))
+    for key, (elapsed, count) in sorted(timings.items(), key=lambda t: t[1][0], reverse=True):
+        print("{:<28}{:>10.3f}{:>10}".format(key, elapsed, count))
+
+
+def nuke(helm_chart, parallelism=None, pg_reset_mode=PG_RESET_TRUNCATE, pg_replica_role=False, helm_timeout=None,
+         namespace_timeout=None, plan=None):
     """
-    Attempts to delete ALL data and objects relating to a Helm Chart and its namespaces, including any Postgres data
+    Attempts to delete ALL data and objects relating to a Helm Chart and its namespaces, including any Postgres data.
+    Postgres is cleared first, then the Helm uninstall runs while the chart's namespaces are deleted and watched
+    until they finish terminating. PVs left behind by the namespaces' PVCs are deleted last, and a timeline
+    of the stages is printed at the end
     :param helm_chart: the name of the Helm chart to nuke
+    :param parallelism: how many PVC/PV delete calls to make at once, defaults to DELETE_PARALLELISM
+    :param pg_reset_mode: how to clear the Postgres tables, PG_RESET_TRUNCATE or PG_RESET_DELETE
+    :param pg_replica_role: clear Postgres with session_replication_role set to 'replica'
+    :param helm_timeout: seconds to let the Helm uninstall run, defaults to HELM_TIMEOUT_SECONDS
+    :param namespace_timeout: seconds to wait for the namespaces to terminate,
+                              defaults to NAMESPACE_DELETION_TIMEOUT_SECONDS
+    :param plan: a TeardownPlan from plan_nuke() to execute instead of looking up Postgres and the PVCs/PVs again
+    :return: the Timeline of the teardown
     """
-    # Check for Postgres
+    namespaces = plan.namespaces if plan is not None else HELM_CHARTS[helm_chart]
+    helm_namespaces = plan.helm_namespaces if plan is not None else None
+    ctx = get_client_context()
+    timeline = Timeline()
+
+    # Check for Postgres, it has to be cleared before the chart removes it
     log_title("Postgres Check")
-    s_name, s_namespace = get_service_name_namespace('postgres')
-    print("Checking if Postgres exists in Helm Chart...")
-    if s_name and s_namespace:
-        if s_namespace in HELM_CHARTS[helm_chart]:
-            clear_pg_database()
+    with timeline.stage('clear postgres') as stage:
+        if plan is not None:
+            s_namespace = plan.postgres_namespace
+        else:
+            print("Checking if Postgres exists in Helm Chart...")
+            _, s_namespace = get_service_name_namespace('postgres')
+        if s_namespace and s_namespace in HELM_CHARTS[helm_chart]:
+            if not clear_pg_database(mode=pg_reset_mode, replica_role=pg_replica_role):
+                stage.result = 'failed'
+        else:
+            stage.result = 'skipped'
 
-    # Run Helm Delete
-    log_title("Deleting Helm Chart: '{}'".format(helm_chart))
-    command = 'helm delete {} --purge'.format(helm_chart)
-    os.system(command)
+    if plan is not None:
+        plan = plan.deletion
+    else:
+        # PVs outlive their namespaces, so find the ones bound to the chart's PVCs before the namespaces go
+        log_title("Planning Persistent Data Cleanup")
+        with timeline.stage('plan persistent data'):
+            plan = plan_persistent_data_deletion(PVC_LIST, namespaces)
+        print_deletion_plan(plan)
 
-    # Remove all user defined namespaces from the NAMESPACES list in order to use the cleanup_persistent_data() function
-    global NAMESPACES
-    del NAMESPACES[:]
+    log_title("Deleting Helm Chart: '{}'".format(helm_chart))
+    # the release's records live in its namespace, so find it before the namespaces start going
+    if helm_namespaces is None:
+        helm_namespaces = find_helm_release_namespaces(helm_chart)
+
+    def uninstall():
+        outputs = []
+        with use_client_context(ctx), timeline.stage('helm uninstall') as stage:
+            if not helm_namespaces:
+                stage.result = 'skipped'
+                outputs.append("Helm release '{}' isn't installed".format(helm_chart))
+            for namespace in helm_namespaces:
+                returncode, output = helm_uninstall(helm_chart, namespace=namespace, timeout=helm_timeout)
+                outputs.append(output)
+                if returncode != 0:
+                    stage.result = 'failed (exit {})'.format(returncode) if returncode is not None else 'failed'
+        return '\n'.join(outputs)
+
+    def delete_and_wait():
+        with use_client_context(ctx):
+            with timeline.stage('delete namespaces') as stage:
+                results = delete_namespaces(namespaces)
+                failed = [ns for ns, (result, _) in results.items() if result == DELETE_RESULT_FAILED]
+                if failed:
+                    stage.result = 'failed: {}'.format(', '.join(sorted(failed)))
+            with timeline.stage('namespace termination') as stage:
+                deleting = [ns for ns, (result, _) in results.items() if result == DELETE_RESULT_DELETED]
+                stuck = wait_for_namespace_deletion(deleting, timeout=namespace_timeout)
+                if stuck:
+                    stage.result = 'stuck: {}'.format(', '.join(sorted(stuck)))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        uninstall_future = executor.submit(uninstall)
+        namespaces_future = executor.submit(delete_and_wait)
+        helm_output = uninstall_future.result()
+        namespaces_future.result()
+
+    print("\n--- helm output ---")
+    print(helm_output.rstrip())
+
+    if plan:
+        log_title("Deleting {} Persistent Data Objects".format(len(plan)))
+        with timeline.stage('delete persistent data') as stage:
+            results = execute_deletion_plan(plan, parallelism=parallelism)
+            if any(result[3] == DELETE_RESULT_FAILED for result in results):
+                stage.result = 'failed'
+        print_deletion_summary(results)
 
-    for namespace in HELM_CHARTS[helm_chart]:
-        NAMESPACES.append(namespace)
+    log_title("Checking Cluster for PVs and PVCs")
+    with timeline.stage('check cluster'):
+        check_for_persistent_data_objects()
 
-    cleanup_persistent_data()
+    log_title("Timeline")
+    print_timeline(timeline)
+    return timeline
 
 
 if __name__ == '__main__':
@@ -702,21 +3574,159 @@ if __name__ == '__main__':
     pg.add_argument("--nsobjects", metavar="NAMESPACE",
                     help="Get ALL objects belonging to the specified namespace")
 
+    pg.add_argument("--resetpg", action='store_true',
+                    help="Clear all data from every Postgres database and schema, resetting the databases in parallel")
+
+    pg.add_argument("--pgsnapshot", metavar="PATH",
+                    help="Save the contents of every table in the Postgres database to a compressed snapshot file")
+
+    pg.add_argument("--pgrestore", metavar="PATH",
+                    help="Replace the contents of the Postgres database's tables with a snapshot file")
+
     pg.add_argument("--nuke", metavar="HELM_CHART",
                         help="Perform a Helm Delete on the specified chart, remove all PVs/PVCs, "
                              "and remove any lingering objects belonging to the related namespaces")
 
+    parser.add_argument("--namespace", metavar="NAMESPACE",
+                        help="Only look for the --debugpod pod in this namespace")
+
+    parser.add_argument("--selector", metavar="LABEL_SELECTOR",
+                        help="Only consider pods matching this label selector for --debugpod (i.e. app=consul)")
+
+    parser.add_argument("--tail", metavar="LINES", type=int,
+                        help="Only print this many lines from the end of the --debugpod logs")
+
+    parser.add_argument("--since", metavar="SECONDS", type=int,
+                        help="Only print --debugpod log lines newer than this many seconds")
+
+    parser.add_argument("--follow", action='store_true',
+                        help="Keep printing new --debugpod log lines until interrupted")
+
+    parser.add_argument("--all-containers", action='store_true',
+                        help="Print the --debugpod logs of every container in the pod, not just the main container")
+
+    parser.add_argument("--log-file", metavar="PATH",
+                        help="Write the --debugpod logs to this file instead of printing them")
+
+    parser.add_argument("--pg-reset-mode", choices=[PG_RESET_TRUNCATE, PG_RESET_DELETE], default=PG_RESET_TRUNCATE,
+                        help="How --nuke and --resetpg clear the Postgres tables: a single TRUNCATE of every table, "
+                             "or a DELETE FROM per table (default: {})".format(PG_RESET_TRUNCATE))
+
+    parser.add_argument("--pg-replica-role", action='store_true',
+                        help="Clear Postgres with session_replication_role set to 'replica' to skip triggers "
+                             "(requires superuser)")
+
+    parser.add_argument("--parallelism", metavar="N", type=int, default=DELETE_PARALLELISM,
+                        help="Number of concurrent PVC/PV deletes for --cleanup and --nuke "
+                             "(default: {})".format(DELETE_PARALLELISM))
+
+    parser.add_argument("--workers", metavar="N", type=int, default=LIST_WORKERS,
+                        help="Number of concurrent list calls to make for --nsobjects (default: {})".format(LIST_WORKERS))
+
+    parser.add_argument("--output", choices=OUTPUT_FORMATS, default=OUTPUT_TABLE,
+                        help="Output format for --listpods and --nsobjects, records are streamed one per line "
+                             "(default: {})".format(OUTPUT_TABLE))
+
+    parser.add_argument("--fields", metavar="FIELD1,FIELD2,...",
+                        help="Only print these object attributes for --listpods and --nsobjects "
+                             "(i.e. metadata.name,status.pod_ip)")
+
+    parser.add_argument("--plan", action='store_true',
+                        help="Print what --cleanup or --nuke would delete, with counts and an estimate of the API "
+                             "requests and time it takes, without deleting anything")
+
+    parser.add_argument("--plan-file", metavar="PATH",
+                        help="With --plan, save the plan to this file. Without --plan, run --cleanup or --nuke "
+                             "from the plan saved in this file instead of listing the cluster again")
+
+    cg = parser.add_mutually_exclusive_group()
+
+    cg.add_argument("--contexts", metavar="CTX1,CTX2,...",
+                    help="Run --listpods, --nsobjects, --cleanup or --values against each of these kubeconfig "
+                         "contexts in parallel")
+
+    cg.add_argument("--all-contexts", action='store_true',
+                    help="Run --listpods, --nsobjects, --cleanup or --values against every kubeconfig context "
+                         "in parallel")
+
     args = parser.parse_args()
 
-    if args.cleanup:
-        cleanup_persistent_data()
+    contexts = None
+    if args.all_contexts:
+        contexts = get_kube_config_context_names()
+    elif args.contexts:
+        contexts = [c.strip() for c in args.contexts.split(',') if c.strip()]
+
+    if contexts and not (args.listpods or args.nsobjects or args.cleanup or args.values):
+        parser.error("--contexts and --all-contexts can only be used with --listpods, --nsobjects, "
+                     "--cleanup or --values")
+
+    if (args.plan or args.plan_file) and not (args.cleanup or args.nuke):
+        parser.error("--plan and --plan-file can only be used with --cleanup or --nuke")
+    if contexts and (args.plan or args.plan_file):
+        parser.error("--plan and --plan-file can't be used with --contexts or --all-contexts")
+
+    fields = parse_fields(args.fields)
+    if fields and (args.listpods or args.nsobjects):
+        try:
+            if args.listpods:
+                validate_fields(fields, 'V1Pod')
+            else:
+                validate_ns_object_fields(fields)
+        except ValueError as ve:
+            parser.error("--fields: {}".format(ve))
+
+    if args.plan:
+        if args.cleanup:
+            teardown_plan = plan_cleanup()
+        else:
+            teardown_plan = plan_nuke(args.nuke)
+        print_teardown_plan(teardown_plan, parallelism=args.parallelism)
+        if args.plan_file:
+            teardown_plan.save(args.plan_file)
+            print("\nPlan saved to '{}', run the same command with --plan-file {} and without --plan "
+                  "to execute it".format(args.plan_file, args.plan_file))
+    elif args.plan_file:
+        command = PLAN_CLEANUP if args.cleanup else PLAN_NUKE
+        teardown_plan = load_teardown_plan(args.plan_file, command, helm_chart=args.nuke)
+        if teardown_plan is None:
+            sys.exit(1)
+        if args.cleanup:
+            cleanup_persistent_data(parallelism=args.parallelism, plan=teardown_plan)
+        else:
+            nuke(args.nuke, parallelism=args.parallelism, pg_reset_mode=args.pg_reset_mode,
+                 pg_replica_role=args.pg_replica_role, plan=teardown_plan)
+    elif contexts:
+        if args.cleanup:
+            action = functools.partial(cleanup_persistent_data, parallelism=args.parallelism)
+        elif args.listpods:
+            action = functools.partial(get_all_pods, output=args.output, fields=fields)
+        elif args.values:
+            action = get_values_for_values_yaml
+        else:
+            action = functools.partial(print_all_objects_belonging_to_namespace, args.nsobjects,
+                                       max_workers=args.workers, output=args.output,
+                                       fields=fields)
+        run_across_contexts(action, contexts)
+    elif args.cleanup:
+        cleanup_persistent_data(parallelism=args.parallelism)
     elif args.listpods:
-        get_all_pods()
+        get_all_pods(output=args.output, fields=fields)
     elif args.values:
         get_values_for_values_yaml()
     elif args.debugpod:
-        debug_pod(args.debugpod)
+        debug_pod(args.debugpod, namespace=args.namespace, label_selector=args.selector, tail_lines=args.tail,
+                  since_seconds=args.since, follow=args.follow, all_containers=args.all_containers,
+                  log_file=args.log_file)
     elif args.nsobjects:
-        print_all_objects_belonging_to_namespace(args.nsobjects)
+        print_all_objects_belonging_to_namespace(args.nsobjects, max_workers=args.workers, output=args.output,
+                                                 fields=fields)
+    elif args.resetpg:
+        reset_pg_databases(mode=args.pg_reset_mode, replica_role=args.pg_replica_role)
+    elif args.pgsnapshot:
+        snapshot_pg_database(args.pgsnapshot)
+    elif args.pgrestore:
+        restore_pg_database(args.pgrestore, replica_role=args.pg_replica_role)
     elif args.nuke:
-        nuke(args.nuke)
+        nuke(args.nuke, parallelism=args.parallelism, pg_reset_mode=args.pg_reset_mode,
+             pg_replica_role=args.pg_replica_role)
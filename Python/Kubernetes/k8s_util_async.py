@@ -0,0 +1,217 @@
+"""
+Asyncio API for k8s_util
+
+Each coroutine runs the matching blocking k8s_util function on a dedicated thread pool, so callers running
+inside an event loop aren't blocked and many operations can be in flight from one process at once.
+The client context (see k8s_util.get_client_context) of the calling thread is carried over to the worker
+threads, or a specific context can be passed in with the 'ctx' argument.
+
+Example:
+    import asyncio
+    import k8s_util_async
+
+    async def main():
+        pods, inventory = await asyncio.gather(k8s_util_async.list_pods(),
+                                               k8s_util_async.get_all_items_in_namespace('frontend'))
+
+    asyncio.run(main())
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# imported as part of the Kubernetes package, or as a script next to k8s_util.py
+try:
+    from . import k8s_util
+except ImportError:
+    import k8s_util
+
+# The most blocking k8s_util calls that may run at once across all coroutines
+ASYNC_MAX_WORKERS = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=ASYNC_MAX_WORKERS, thread_name_prefix='k8s_util_async')
+    return _executor
+
+
+def _call_in_context(ctx, func, args, kwargs):
+    with k8s_util.use_client_context(ctx):
+        return func(*args, **kwargs)
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Runs any blocking k8s_util function on the worker thread pool
+    :param func: the function to run
+    :param args: positional arguments for the function
+    :param kwargs: keyword arguments for the function, 'ctx' selects the K8sClientContext to run it with
+    :return: the function's result
+    """
+    ctx = kwargs.pop('ctx', None) or k8s_util.get_client_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(),
+                                      functools.partial(_call_in_context, ctx, func, args, kwargs))
+
+
+def shutdown():
+    """
+    Shuts down the worker thread pool, waiting for any running calls to finish
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+"""
+--------------------------
+      POD FUNCTIONS
+--------------------------
+"""
+
+
+async def list_pods(namespace=None, label_selector=None, field_selector=None, ctx=None):
+    """
+    Lists pods, optionally filtered by the API server
+    :param namespace: only list pods in this namespace
+    :param label_selector: only list pods matching this label selector
+    :param field_selector: only list pods matching this field selector
+    :param ctx: the K8sClientContext to use, defaults to the calling thread's context
+    :return: a list of pods
+    """
+    def _list():
+        return list(k8s_util.find_objects('pod', namespace=namespace, label_selector=label_selector,
+                                          field_selector=field_selector, use_cache=False, raw=False))
+
+    return await run_sync(_list, ctx=ctx)
+
+
+async def get_pod_name_namespace(pod_shortname, namespace=None, label_selector=None, ctx=None):
+    """
+    Async k8s_util.get_pod_name_namespace()
+    """
+    return await run_sync(k8s_util.get_pod_name_namespace, pod_shortname, namespace=namespace,
+                          label_selector=label_selector, ctx=ctx)
+
+
+async def get_pod_information(pod_shortname, namespace=None, label_selector=None, include_log=True, tail_lines=None,
+                              since_seconds=None, ctx=None):
+    """
+    Async k8s_util.get_pod_information()
+    """
+    return await run_sync(k8s_util.get_pod_information, pod_shortname, namespace=namespace,
+                          label_selector=label_selector, include_log=include_log, tail_lines=tail_lines,
+                          since_seconds=since_seconds, ctx=ctx)
+
+
+"""
+--------------------------
+    NAMESPACE FUNCTIONS
+--------------------------
+"""
+
+
+async def get_all_items_in_namespace(namespace, max_workers=None, timings=None, on_result=None, errors=None,
+                                     refresh_discovery=False, fields=None, ctx=None):
+    """
+    Async k8s_util.get_all_items_in_namespace()
+    on_result is called on the list worker threads rather than the event loop, use loop.call_soon_threadsafe()
+    from it to hand the results to a coroutine
+    """
+    return await run_sync(k8s_util.get_all_items_in_namespace, namespace, max_workers=max_workers,
+                          timings=timings, on_result=on_result, errors=errors,
+                          refresh_discovery=refresh_discovery, fields=fields, ctx=ctx)
+
+
+"""
+--------------------------
+    STORAGE FUNCTIONS
+--------------------------
+"""
+
+
+async def plan_persistent_data_deletion(pvc_names=None, namespaces=None, ctx=None):
+    """
+    Async k8s_util.plan_persistent_data_deletion()
+    """
+    return await run_sync(k8s_util.plan_persistent_data_deletion, pvc_names, namespaces, ctx=ctx)
+
+
+async def execute_deletion_plan(plan, parallelism=None, ctx=None):
+    """
+    Async k8s_util.execute_deletion_plan()
+    """
+    return await run_sync(k8s_util.execute_deletion_plan, plan, parallelism=parallelism, ctx=ctx)
+
+
+async def cleanup_persistent_data(pvc_names=None, namespaces=None, parallelism=None, ctx=None):
+    """
+    Deletes the PVCs matching the PVC names or belonging to the namespaces, and the PVs bound to them
+    :param pvc_names: unique portions of PVC names to delete, defaults to k8s_util.PVC_LIST
+    :param namespaces: namespaces whose PVCs should all be deleted, defaults to k8s_util.NAMESPACES
+    :param parallelism: how many delete calls to make at once, defaults to k8s_util.DELETE_PARALLELISM
+    :param ctx: the K8sClientContext to use, defaults to the calling thread's context
+    :return: the per-object results, as returned by k8s_util.execute_deletion_plan()
+    """
+    ctx = ctx or k8s_util.get_client_context()
+    plan = await plan_persistent_data_deletion(pvc_names, namespaces, ctx=ctx)
+    if not plan:
+        return []
+    return await execute_deletion_plan(plan, parallelism=parallelism, ctx=ctx)
+
+
+"""
+--------------------------
+    SERVICE FUNCTIONS
+--------------------------
+"""
+
+
+async def get_service_name_namespace(service_shortname, namespace=None, label_selector=None, ctx=None):
+    """
+    Async k8s_util.get_service_name_namespace()
+    """
+    return await run_sync(k8s_util.get_service_name_namespace, service_shortname, namespace=namespace,
+                          label_selector=label_selector, ctx=ctx)
+
+
+async def get_service_object(service_shortname, namespace=None, label_selector=None, ctx=None):
+    """
+    Async k8s_util.get_service_object()
+    """
+    return await run_sync(k8s_util.get_service_object, service_shortname, namespace=namespace,
+                          label_selector=label_selector, ctx=ctx)
+
+
+async def get_service_port(service_shortname, ctx=None):
+    """
+    Async k8s_util.get_service_port()
+    """
+    return await run_sync(k8s_util.get_service_port, service_shortname, ctx=ctx)
+
+
+"""
+--------------------------
+     SCRIPT FUNCTIONS
+--------------------------
+"""
+
+
+async def nuke(helm_chart, parallelism=None, pg_reset_mode=k8s_util.PG_RESET_TRUNCATE, pg_replica_role=False,
+               helm_timeout=None, namespace_timeout=None, ctx=None):
+    """
+    Async k8s_util.nuke()
+    """
+    return await run_sync(k8s_util.nuke, helm_chart, parallelism=parallelism, pg_reset_mode=pg_reset_mode,
+                          pg_replica_role=pg_replica_role, helm_timeout=helm_timeout,
+                          namespace_timeout=namespace_timeout, ctx=ctx)
@@ -1,6 +1,20 @@
+import codecs
 import json
+import os
+import ssl
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 HTTP_GET = "GET"
 HTTP_POST = "POST"
@@ -10,59 +24,510 @@ HTTP_PATCH = "PATCH"
 
 HTTP_ACTIONS = {HTTP_GET, HTTP_POST, HTTP_PUT, HTTP_DELETE, HTTP_PATCH}
 
+# Methods that send the payload as the request body
+HTTP_BODY_ACTIONS = {HTTP_POST, HTTP_PUT, HTTP_PATCH}
+
+# The CA bundle used to verify servers when ca_verify is set
+CA_BUNDLE = 'cacert.pem'
+
+# How many keep-alive connections to hold open to each host, and how many hosts to keep connection pools for
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_HOSTS = 10
+
+# How many calls rest_batch() makes at once in total and to any one host
+BATCH_MAX_WORKERS = 16
+BATCH_PER_HOST = DEFAULT_POOL_SIZE
+
+# How many bytes to read from a streamed response at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _SSLContextAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connection pools all share one pre-built SSLContext, so the CA bundle is loaded once
+    instead of for every new connection
+    """
+
+    def __init__(self, ssl_context, **kwargs):
+        self._ssl_context = ssl_context
+        super(_SSLContextAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super(_SSLContextAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super(_SSLContextAdapter, self).proxy_manager_for(*args, **kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        # The SSLContext already trusts the right CAs, don't have urllib3 load a bundle into it per connection
+        host_params, pool_kwargs = super(_SSLContextAdapter, self).build_connection_pool_key_attributes(
+            request, verify, cert)
+        pool_kwargs.pop('ca_certs', None)
+        pool_kwargs.pop('ca_cert_dir', None)
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        # Older versions of requests set the CA bundle on each connection here instead
+        super(_SSLContextAdapter, self).cert_verify(conn, url, verify, cert)
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+
+
+def create_ssl_context(ca_verify, ca_bundle=CA_BUNDLE):
+    """
+    Builds the SSLContext shared by every connection of a RestClient
+    :param ca_verify: verify servers against the CA bundle, otherwise certificates aren't checked at all
+    :param ca_bundle: the CA bundle to verify against
+    :return: an ssl.SSLContext
+    """
+    if ca_verify:
+        return ssl.create_default_context(cafile=ca_bundle)
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class RestClient(object):
+    """
+    Sends REST calls over pooled keep-alive connections, so repeated calls to the same host reuse an open
+    connection instead of paying for a new TCP connect and TLS handshake every time. A client can be shared
+    between threads
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS, ca_bundle=CA_BUNDLE,
+                 timeout=None):
+        """
+        :param pool_size: how many connections to keep open to each host
+        :param pool_hosts: how many hosts to keep connection pools for
+        :param ca_bundle: the CA bundle used to verify servers when ca_verify is set
+        :param timeout: seconds to wait to connect and for each read, or a (connect, read) tuple,
+                        defaults to waiting forever
+        """
+        self.pool_size = pool_size
+        self.pool_hosts = pool_hosts
+        self.ca_bundle = ca_bundle
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, ca_verify):
+        """
+        Gets the Session used for verified or unverified calls. They are kept apart since urllib3 sets the
+        verify mode on the SSLContext it's given
+        """
+        session = self._sessions.get(ca_verify)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(ca_verify)
+                if session is None:
+                    if not ca_verify:
+                        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+                    adapter = _SSLContextAdapter(create_ssl_context(ca_verify, self.ca_bundle),
+                                                 pool_connections=self.pool_hosts, pool_maxsize=self.pool_size)
+                    session = requests.Session()
+                    session.verify = ca_verify
+                    session.mount('https://', adapter)
+                    session.mount('http://', HTTPAdapter(pool_connections=self.pool_hosts,
+                                                         pool_maxsize=self.pool_size))
+                    self._sessions[ca_verify] = session
+        return session
+
+    def request(self, http_method, url, params=None, data=None, headers=None, ca_verify=False, **kwargs):
+        """
+        Sends a REST call
+        :param http_method: one of HTTP_ACTIONS
+        :param url: the URL to call
+        :param params: query string parameters
+        :param data: the request body
+        :param headers: request headers
+        :param ca_verify: verify the server against the CA bundle
+        :param kwargs: any other requests.Session.request() arguments
+        :return: the requests.Response
+        """
+        if http_method not in HTTP_ACTIONS:
+            raise ValueError("Unsupported HTTP method '{}', expected one of {}".format(
+                http_method, ', '.join(sorted(HTTP_ACTIONS))))
+        kwargs.setdefault('timeout', self.timeout)
+        return self._session(bool(ca_verify)).request(http_method, url, params=params, data=data, headers=headers,
+                                                      verify=bool(ca_verify), **kwargs)
+
+    def close(self):
+        """
+        Closes every pooled connection
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Gets the RestClient shared by do_rest() and the rest_* functions, created on first use
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = RestClient()
+    return _default_client
+
+
+def set_default_client(rest_client):
+    """
+    Replaces the RestClient shared by do_rest() and the rest_* functions (i.e. to change the pool size)
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = rest_client
+
+
+def encode_json(obj):
+    """
+    Serializes an object to JSON bytes, using orjson when it's installed since it's several times faster
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # i.e. non-string dictionary keys, which the json module converts
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+
+def decode_json(data):
+    """
+    Parses JSON text or bytes, using orjson when it's installed
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
-def do_rest(url, http_method, verbose=False, params=None, payload=None, headers=None, ca_verify=False):
-    payload = json.dumps(payload)
+def get_json(response):
+    """
+    Parses a response's JSON body the first time it's asked for, later calls return the same object
+    :param response: a requests.Response returned by do_rest()
+    :return: the decoded JSON
+    :raises ValueError: if the body isn't JSON
+    """
+    try:
+        return response.parsed_json
+    except AttributeError:
+        response.parsed_json = decode_json(response.content)
+        return response.parsed_json
+
+
+def _format_json(value):
+    """
+    Pretty-prints a payload or response body for verbose output, bodies that aren't JSON are printed as text
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        try:
+            value = decode_json(value)
+        except ValueError:
+            return value.decode('utf-8', 'replace') if isinstance(value, (bytes, bytearray)) else value
+    return json.dumps(value, indent=4, default=str)
+
+
+def do_rest(url, http_method, verbose=False, params=None, payload=None, headers=None, ca_verify=False,
+            rest_client=None, stream=False):
+    """
+    Sends a REST call. The payload is only encoded for methods that send a body, and the response body is
+    only decoded when verbose is set or when get_json() is called on the response
+    :param url: the URL to call
+    :param http_method: one of HTTP_ACTIONS
+    :param verbose: print the request and the (pretty-printed) response
+    :param params: query string parameters
+    :param payload: the body for POST, PUT and PATCH calls, either an object to send as JSON or already
+                    encoded bytes or str
+    :param headers: request headers
+    :param ca_verify: verify the server against the CA bundle
+    :param rest_client: the RestClient to send the call with, defaults to get_default_client()
+    :param stream: don't read the response body, read it with iter_chunks(), download_to() or
+                   iter_json_items() instead. The connection is held until the body is read or the response
+                   is closed
+    :return: the requests.Response
+    """
+    data = None
+    if http_method in HTTP_BODY_ACTIONS and payload is not None:
+        data = payload if isinstance(payload, (bytes, bytearray, str)) else encode_json(payload)
 
     if verbose:
         print("URL: {}".format(url))
         print("\nHeaders: \n{}".format(json.dumps(headers, indent=4)))
-        print("\nPayload: \n{}".format(json.dumps(json.loads(payload), indent=4)))
+        if data is not None:
+            print("\nPayload: \n{}".format(_format_json(payload)))
 
-    if ca_verify:
-        verify = 'cacert.pem'
-    else:
-        verify = False
-        requests.packages.urllib3.disable_warnings()
-
-    response = None
-    if http_method == HTTP_GET:
-        response = requests.get(url=url, headers=headers, params=params, verify=verify)
-    elif http_method == HTTP_POST:
-        response = requests.post(url=url, data=payload, headers=headers, params=params, verify=verify, cookies=None)
-    elif http_method == HTTP_PUT:
-        response = requests.put(url=url, data=payload, headers=headers, params=params, verify=verify)
-    elif http_method == HTTP_DELETE:
-        response = requests.delete(url=url, headers=headers, params=params, verify=verify)
-    elif http_method == HTTP_PATCH:
-        response = requests.patch(url=url, data=payload, headers=headers, params=params, verify=verify)
-
-    content = json.loads(response.content)
-    formatted_content = json.dumps(content, indent=4)
+    response = (rest_client or get_default_client()).request(http_method, url, params=params, data=data,
+                                                             headers=headers, ca_verify=ca_verify, stream=stream)
 
     if verbose:
         print("\nResponse Status/Reason: {} / {}".format(response.status_code, response.reason))
+        if stream:
+            print("\nResponse Body: streamed ({} bytes)".format(response.headers.get('Content-Length', 'unknown')))
+            return response
         print("\nResponse Body:")
-        print(formatted_content)
+        try:
+            print(json.dumps(get_json(response), indent=4, default=str))
+        except ValueError:
+            print(response.text)
 
     return response
 
 
+def iter_chunks(response, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Reads a streamed response body a chunk at a time, the response is closed once the body is read
+    :param response: a requests.Response returned by do_rest(stream=True)
+    :param chunk_size: how many bytes to read at a time
+    :return: a generator of bytes
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def download_to(response, sink, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Writes a streamed response body to a file without holding it in memory
+    :param response: a requests.Response returned by do_rest(stream=True)
+    :param sink: a file path, or a file-like object with a write() method. A path is written to
+                 '<path>.part' and only renamed once the whole body has been read, so a failed download
+                 doesn't leave a truncated file behind
+    :param chunk_size: how many bytes to read at a time
+    :return: the number of bytes written
+    """
+    written = 0
+    if hasattr(sink, 'write'):
+        for chunk in iter_chunks(response, chunk_size):
+            sink.write(chunk)
+            written += len(chunk)
+        return written
+
+    tmp_path = '{}.part'.format(sink)
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter_chunks(response, chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, sink)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+_JSON_NUMBER_CHARS = frozenset('0123456789+-.eE')
+
+
+def iter_json_items(response, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Parses a streamed response whose body is a JSON array, yielding each item as soon as it's been read.
+    Only the item being parsed and one chunk are held in memory, however large the array is
+    :param response: a requests.Response returned by do_rest(stream=True)
+    :param chunk_size: how many bytes to read at a time
+    :return: a generator of the decoded array items
+    :raises ValueError: if the body isn't a JSON array
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='strict')
+    chunks = iter_chunks(response, chunk_size)
+    state = {'buf': '', 'pos': 0, 'eof': False}
+
+    def read_more(need=1):
+        """
+        Appends at least 'need' characters to the buffer, unless the body ends first
+        """
+        # drop what's already been parsed before growing the buffer
+        state['buf'] = state['buf'][state['pos']:]
+        state['pos'] = 0
+        added = 0
+        while added < need and not state['eof']:
+            try:
+                part = text.decode(next(chunks))
+            except StopIteration:
+                part = text.decode(b'', final=True)
+                state['eof'] = True
+            state['buf'] += part
+            added += len(part)
+        return added > 0
+
+    def next_char():
+        """
+        Skips whitespace and returns the next character without consuming it, or '' at the end of the body
+        """
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not read_more():
+                return ''
+
+    try:
+        if next_char() != '[':
+            raise ValueError("Response body isn't a JSON array")
+        state['pos'] += 1
+        if next_char() == ']':
+            return
+
+        while True:
+            if next_char() == '':
+                raise ValueError("Response body ended inside the JSON array")
+            # a number that runs to the end of the buffer may have been cut short (i.e. '12' of '123' or '4.5'
+            # of '4.5e3'), so it's only accepted once a character that can't continue it follows
+            try:
+                item, end = decoder.raw_decode(state['buf'], state['pos'])
+                complete = state['eof'] or (end < len(state['buf']) and state['buf'][end] not in _JSON_NUMBER_CHARS)
+            except ValueError:
+                if state['eof']:
+                    raise
+                complete = False
+            if not complete:
+                # read at least as much again as is buffered, so large items aren't re-parsed once per chunk
+                read_more(max(chunk_size, len(state['buf']) - state['pos']))
+                continue
+            state['pos'] = end
+            yield item
+
+            separator = next_char()
+            state['pos'] += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError("Expected ',' or ']' after a JSON array item, got {!r}".format(separator))
+    finally:
+        chunks.close()
+
+
 def rest_get(url, params=None, headers=None):
     return do_rest(url, HTTP_GET, params=params, headers=headers)
 
 
 def rest_post(url, payload, params=None, headers=None):
-    return do_rest(url, HTTP_POST, params, payload, headers)
+    return do_rest(url, HTTP_POST, params=params, payload=payload, headers=headers)
 
 
 def rest_put(url, payload, params=None, headers=None):
-    return do_rest(url, HTTP_PUT, params, payload, headers)
+    return do_rest(url, HTTP_PUT, params=params, payload=payload, headers=headers)
 
 
 def rest_delete(url, params=None, headers=None):
     return do_rest(url, HTTP_DELETE, params=params, headers=headers)
 
 
-def rest_patch(url, params=None, headers=None):
-    return do_rest(url, HTTP_PATCH, params=params, headers=headers)
+def rest_patch(url, params=None, headers=None, payload=None):
+    return do_rest(url, HTTP_PATCH, params=params, payload=payload, headers=headers)
+
+
+BatchResult = namedtuple('BatchResult', ['index', 'spec', 'response', 'error'])
+
+
+def rest_batch(specs, max_workers=BATCH_MAX_WORKERS, per_host=BATCH_PER_HOST, ordered=False, window=None,
+               headers=None, ca_verify=False, rest_client=None):
+    """
+    Sends many REST calls concurrently on a thread pool, yielding each result as soon as it's available.
+    Specs are read from the iterable only as there's room for them, and at most 'window' calls are in flight
+    or waiting to be yielded at once, so a batch of any size is streamed through in bounded memory
+    :param specs: iterable of (method, url[, params[, payload[, headers]]]) tuples
+    :param max_workers: how many calls to make at once
+    :param per_host: how many calls to make at once to any one host (scheme, host and port). Keep this at or
+                     below the client's pool_size so every call gets a pooled connection
+    :param ordered: yield results in the order of the specs, otherwise as they complete
+    :param window: how many calls may be in flight or waiting to be yielded, defaults to twice max_workers
+    :param headers: headers for specs that don't have their own
+    :param ca_verify: verify the servers against the CA bundle
+    :param rest_client: the RestClient to send the calls with, defaults to get_default_client()
+    :return: a generator of BatchResults (index, spec, response, error). When a call raises (i.e. the
+             connection fails), response is None and error is the exception
+    """
+    rest_client = rest_client or get_default_client()
+    window = max(window or 2 * max_workers, max_workers)
+
+    def send(spec):
+        method, url = spec[0], spec[1]
+        params = spec[2] if len(spec) > 2 else None
+        payload = spec[3] if len(spec) > 3 else None
+        spec_headers = spec[4] if len(spec) > 4 else headers
+        return do_rest(url, method, params=params, payload=payload, headers=spec_headers, ca_verify=ca_verify,
+                       rest_client=rest_client)
+
+    source = enumerate(specs)
+    exhausted = False
+    in_flight = {}
+    host_calls = {}
+    # specs read from the source whose host is already at its limit
+    deferred = deque()
+    # ordered results that completed before an earlier one
+    completed = {}
+    next_index = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def can_send(host):
+        return len(in_flight) < max_workers and host_calls.get(host, 0) < per_host
+
+    def submit(index, spec, host):
+        in_flight[executor.submit(send, spec)] = (index, spec, host)
+        host_calls[host] = host_calls.get(host, 0) + 1
+
+    try:
+        while True:
+            for item in list(deferred):
+                if can_send(item[2]):
+                    deferred.remove(item)
+                    submit(*item)
+
+            while not exhausted and len(in_flight) + len(deferred) + len(completed) < window:
+                try:
+                    index, spec = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                host = urlsplit(spec[1]).netloc
+                if can_send(host):
+                    submit(index, spec, host)
+                else:
+                    deferred.append((index, spec, host))
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, spec, host = in_flight.pop(future)
+                host_calls[host] -= 1
+                try:
+                    result = BatchResult(index, spec, future.result(), None)
+                except Exception as e:
+                    result = BatchResult(index, spec, None, e)
+
+                if not ordered:
+                    yield result
+                    continue
+                completed[index] = result
+                while next_index in completed:
+                    yield completed.pop(next_index)
+                    next_index += 1
+    finally:
+        executor.shutdown(wait=True)